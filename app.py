@@ -1,16 +1,20 @@
 import os
-from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from pathlib import Path
 from urllib.parse import urlparse
 
 from flask import Flask
 from flask_login import LoginManager
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.interval import IntervalTrigger
 
 from src.extensions import db
-from src.models import User, Event, Task, Contact, Note, Tag, TaskNote, TaskLink, Subtask, Bookmark, GmailAccount, OutlookAccount
+from src.schema import ensure_schema
+from src.mail_search import ensure_mail_fts
+from src.mail_threads import ensure_conversation_index
+from src.facets import ensure_task_facets
+from src.search import ensure_search_index
+from src.ics import ensure_event_uids
+from src.suggest import load_suggest_indexes
+from src.models import User, Event, Task, Contact, Note, Tag, TaskNote, TaskLink, Subtask, Bookmark, GmailAccount, OutlookAccount, MailMessage, MailSyncState, MailConversation, TaskFacet, EventOverride, DeliveredReminder, WorkerLock, Notification
 from src.routes.auth import auth_bp, init_login_manager
 from src.routes.dashboard import dashboard_bp
 from src.routes.contacts import contacts_bp
@@ -19,6 +23,9 @@ from src.routes.tasks import tasks_bp
 from src.routes.calendar import calendar_bp
 from src.routes.bookmarks import bookmarks_bp
 from src.routes.email import email_bp
+from src.routes.api import api_bp
+from src.routes.notify import notify_bp
+from src.routes.search import search_bp
 
 load_dotenv()
 
@@ -58,7 +65,20 @@ def create_app():
     app.config['GOOGLE_TOKEN_DIR'] = str(DATA_DIR / "gmail" / "tokens")
     app.config['OUTLOOK_APP_CONFIG'] = str(DATA_DIR / "outlook" / "app_config.json")
     app.config['OUTLOOK_TOKEN_DIR'] = str(DATA_DIR / "outlook" / "tokens")
+    app.config['SEARCH_PAGE_SIZE'] = int(os.getenv('SEARCH_PAGE_SIZE', '30'))
+    app.config['TASKS_PAGE_SIZE'] = int(os.getenv('TASKS_PAGE_SIZE', '50'))
     app.config['EMAIL_LOOKBACK_DAYS'] = int(os.getenv('EMAIL_LOOKBACK_DAYS', '5'))
+    app.config['EMAIL_SYNC_MINUTES'] = int(os.getenv('EMAIL_SYNC_MINUTES', '5'))
+    app.config['EMAIL_SYNC_MAX_MESSAGES'] = int(os.getenv('EMAIL_SYNC_MAX_MESSAGES', '500'))  # per account
+    app.config['EMAIL_PAGE_SIZE'] = int(os.getenv('EMAIL_PAGE_SIZE', '50'))
+    app.config['EMAIL_FETCH_WORKERS'] = int(os.getenv('EMAIL_FETCH_WORKERS', '4'))
+    app.config['EMAIL_FETCH_DEADLINE_MS'] = int(os.getenv('EMAIL_FETCH_DEADLINE_MS', '8000'))
+    app.config['EMAIL_CLIENT_TTL_SECONDS'] = int(os.getenv('EMAIL_CLIENT_TTL_SECONDS', '1800'))
+    app.config['GRAPH_POOL_SIZE'] = int(os.getenv('GRAPH_POOL_SIZE', '10'))
+    app.config['EMAIL_GMAIL_BATCH_SIZE'] = int(os.getenv('EMAIL_GMAIL_BATCH_SIZE', '50'))  # Gmail allows up to 100
+    app.config['REMINDER_LEAD_MINUTES'] = int(os.getenv('REMINDER_LEAD_MINUTES', '5'))
+    app.config['REMINDER_POLL_SECONDS'] = int(os.getenv('REMINDER_POLL_SECONDS', '15'))  # pick up edits made by web workers
+    app.config['WORKER_LOCK_TTL_SECONDS'] = int(os.getenv('WORKER_LOCK_TTL_SECONDS', '60'))
 
     print("=== PMS Startup ===")
     print("DB URI:", app.config['SQLALCHEMY_DATABASE_URI'])
@@ -67,6 +87,14 @@ def create_app():
     db.init_app(app)
     with app.app_context():
         db.create_all()
+        for col in ensure_schema():
+            print("[DB] Added column", col)
+        ensure_mail_fts()
+        ensure_conversation_index()
+        ensure_task_facets()
+        ensure_search_index()
+        ensure_event_uids()
+        load_suggest_indexes()
 
     # Blueprints
     app.register_blueprint(auth_bp)
@@ -77,31 +105,16 @@ def create_app():
     app.register_blueprint(calendar_bp, url_prefix="/calendar")
     app.register_blueprint(bookmarks_bp, url_prefix="/bookmarks")
     app.register_blueprint(email_bp, url_prefix="/email")
+    app.register_blueprint(api_bp, url_prefix="/api/v1")
+    app.register_blueprint(notify_bp, url_prefix="/notify")
+    app.register_blueprint(search_bp, url_prefix="/search")
 
     # Login
     login_manager = LoginManager()
     init_login_manager(login_manager, app)
 
-    # Background scheduler (guard against debugger double-run)
-    if app.config['SCHEDULER_ENABLED']:
-        is_main = os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not app.debug
-        if is_main:
-            scheduler = BackgroundScheduler(
-                daemon=True,
-                timezone=app.config.get('TIMEZONE', 'America/Chicago')
-            )
-            scheduler.add_job(
-                func=check_due_items,
-                args=[app],
-                trigger=IntervalTrigger(minutes=1),
-                id='check_due_items',
-                replace_existing=True,
-                coalesce=True,
-                max_instances=1
-            )
-            scheduler.start()
-            import atexit
-            atexit.register(lambda: scheduler.shutdown(wait=False))
+    # Scheduled jobs (mail sync, token refresh, reminders) run in the worker process:
+    # python -m src.worker
 
     @app.route("/healthz")
     def healthz():
@@ -109,24 +122,6 @@ def create_app():
 
     return app
 
-def check_due_items(app):
-    from datetime import datetime, timedelta
-    from src.models import Task, Event
-    try:
-        with app.app_context():
-            now = datetime.now()
-            soon = now + timedelta(minutes=5)
-            due_tasks = Task.query.filter(Task.due_at != None, Task.due_at <= soon, Task.status != 'done').all()
-            due_events = Event.query.filter(Event.start_at != None, Event.start_at <= soon).all()
-            for t in due_tasks:
-                print(f"[REMINDER] Task due soon: {t.title} @ {t.due_at}")
-            for e in due_events:
-                print(f"[REMINDER] Event starting soon: {e.title} @ {e.start_at}")
-    except Exception as ex:
-        import traceback
-        print("[Scheduler] check_due_items failed:", ex)
-        traceback.print_exc()
-
 if __name__ == "__main__":
     app = create_app()
 
@@ -0,0 +1,129 @@
+from sqlalchemy import event, select, update, func, case
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from .extensions import db
+from .models import Task, Tag, TaskFacet, task_tags
+
+# Facet counts for the task list (per status, category and tag: total and open tasks),
+# stored in task_facet so the list page reads them without aggregating. ORM writes are
+# folded in from before_flush as +/- deltas; set-based writes (task_bulk) diff a GROUP BY
+# snapshot of the rows they touch.
+
+FACET_KINDS = ('status', 'category', 'tag')
+_CHUNK = 500
+
+def _contrib(status, category, tag_names):
+    """The facets one task counts towards, as {(kind, value): (total, open)}."""
+    status = status or 'todo'
+    is_open = int(status != 'done')
+    keys = [('status', status), ('category', category or 'other')] + [('tag', n) for n in tag_names]
+    return {k: (1, is_open) for k in keys}
+
+def _add(delta, contrib, sign):
+    for key, (total, is_open) in contrib.items():
+        t, o = delta.get(key, (0, 0))
+        delta[key] = (t + sign * total, o + sign * is_open)
+
+def _old(state, attr):
+    hist = state.attrs[attr].history
+    if hist.deleted:
+        return hist.deleted[0]
+    return hist.unchanged[0] if hist.unchanged else getattr(state.obj(), attr)
+
+def apply_delta(connection, delta):
+    rows = [{'kind': k, 'value': v, 'total': t, 'open': o} for (k, v), (t, o) in delta.items() if t or o]
+    if not rows:
+        return
+    table = TaskFacet.__table__
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        ins = (sqlite_insert if dialect == 'sqlite' else pg_insert)(table)
+        stmt = ins.on_conflict_do_update(index_elements=['kind', 'value'], set_={
+            'total': table.c.total + ins.excluded.total, 'open': table.c.open + ins.excluded.open})
+        connection.execute(stmt, rows)
+        return
+    for row in rows:
+        res = connection.execute(update(table).where(table.c.kind == row['kind'], table.c.value == row['value'])
+                                 .values(total=table.c.total + row['total'], open=table.c.open + row['open']))
+        if not res.rowcount:
+            connection.execute(table.insert(), [row])
+
+@event.listens_for(Session, 'before_flush')
+def _task_facets(session, flush_context, instances):
+    delta = {}
+    for t in session.new:
+        if isinstance(t, Task):
+            _add(delta, _contrib(t.status, t.category, [g.name for g in t.tags]), +1)
+    for t in session.deleted:
+        if isinstance(t, Task) and t.id is not None:
+            state = db.inspect(t)
+            _add(delta, _contrib(_old(state, 'status'), _old(state, 'category'), [g.name for g in t.tags]), -1)
+    for t in session.dirty:
+        if not isinstance(t, Task) or t in session.deleted:
+            continue
+        state = db.inspect(t)
+        tags_hist = state.attrs.tags.history
+        changed = any(state.attrs[a].history.has_changes() for a in ('status', 'category'))
+        if not changed and not tags_hist.has_changes():
+            continue
+        if tags_hist.has_changes():
+            old_tags = [g.name for g in (*tags_hist.unchanged, *tags_hist.deleted)]
+        else:
+            old_tags = [g.name for g in t.tags]
+        _add(delta, _contrib(_old(state, 'status'), _old(state, 'category'), old_tags), -1)
+        _add(delta, _contrib(t.status, t.category, [g.name for g in t.tags]), +1)
+    if delta:
+        apply_delta(session.connection(), delta)
+
+@event.listens_for(Tag, 'after_update')
+def _tag_renamed(mapper, connection, target):
+    hist = db.inspect(target).attrs.name.history
+    if hist.deleted and hist.deleted[0] != target.name:
+        connection.execute(update(TaskFacet.__table__)
+                           .where(TaskFacet.kind == 'tag', TaskFacet.value == hist.deleted[0])
+                           .values(value=target.name))
+
+def _merge(out, kind, rows):
+    for value, total, opened in rows:
+        t, o = out.get((kind, value), (0, 0))
+        out[(kind, value)] = (t + total, o + (opened or 0))
+
+def snapshot(ids):
+    """Facet contribution of the tasks `ids` as they are now: {(kind, value): (total, open)}."""
+    out = {}
+    opened = func.sum(case((Task.status == 'done', 0), else_=1))
+    for i in range(0, len(ids), _CHUNK):
+        chunk = ids[i:i + _CHUNK]
+        for kind, col in (('status', func.coalesce(Task.status, 'todo')),
+                          ('category', func.coalesce(Task.category, 'other'))):
+            _merge(out, kind, db.session.execute(
+                select(col, func.count(), opened).where(Task.id.in_(chunk)).group_by(col)))
+        _merge(out, 'tag', db.session.execute(
+            select(Tag.name, func.count(), opened).select_from(task_tags)
+            .join(Task, Task.id == task_tags.c.task_id).join(Tag, Tag.id == task_tags.c.tag_id)
+            .where(task_tags.c.task_id.in_(chunk)).group_by(Tag.name)))
+    return out
+
+def apply_snapshot_change(before, after):
+    delta = {}
+    _add(delta, before, -1)
+    _add(delta, after, +1)
+    apply_delta(db.session.connection(), delta)
+
+def task_facets():
+    """{kind: [(value, total, open), ...]} for non-empty facets, from the stored counts."""
+    out = {k: [] for k in FACET_KINDS}
+    for f in TaskFacet.query.filter(TaskFacet.total > 0).order_by(TaskFacet.kind, TaskFacet.value):
+        out.setdefault(f.kind, []).append((f.value, f.total, f.open))
+    return out
+
+def rebuild_task_facets():
+    TaskFacet.query.delete()
+    ids = db.session.scalars(select(Task.id)).all()
+    apply_delta(db.session.connection(), snapshot(ids))
+    db.session.commit()
+
+def ensure_task_facets():
+    if TaskFacet.query.first() is None and Task.query.first() is not None:
+        rebuild_task_facets()
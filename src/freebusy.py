@@ -0,0 +1,76 @@
+import heapq
+from collections import namedtuple
+from datetime import timedelta
+from .models import Task
+from .recurrence import occurrences_between
+
+# Free/busy over one window. Busy time comes from event occurrences (recurring series
+# expanded for the window) and from open tasks that have both a start and a due date.
+# The window query does the range work in the database; what comes back is swept once in
+# start order, so merging and overlap detection cost O(n log n + overlaps), not O(n^2).
+
+Slot = namedtuple('Slot', 'start end kind ref title')  # kind: 'event' | 'task'; ref: event id / task id
+
+def busy_slots(start, end, include_tasks=True):
+    """Everything with a duration overlapping [start, end), sorted by start."""
+    slots = []
+    for o in occurrences_between(start, end):
+        if o.end_at and o.end_at > o.start_at:
+            ref = o.event_id if o.recurrence_id is None else f"{o.event_id}@{o.recurrence_id.isoformat()}"
+            slots.append(Slot(o.start_at, o.end_at, 'event', ref, o.title))
+    if include_tasks:
+        rows = (Task.query.with_entities(Task.id, Task.title, Task.start_at, Task.due_at)
+                .filter(Task.status != 'done', Task.start_at.isnot(None), Task.due_at.isnot(None),
+                        Task.start_at < end, Task.due_at > start, Task.due_at > Task.start_at))
+        slots += [Slot(r.start_at, r.due_at, 'task', r.id, r.title) for r in rows]
+    slots.sort(key=lambda s: (s.start, s.end))
+    return slots
+
+def merge_busy(slots):
+    """Sorted slots -> disjoint busy blocks [(start, end, [slots])]."""
+    blocks = []
+    for s in slots:
+        if blocks and s.start < blocks[-1][1]:
+            blocks[-1][1] = max(blocks[-1][1], s.end)
+            blocks[-1][2].append(s)
+        else:
+            blocks.append([s.start, s.end, [s]])
+    return [tuple(b) for b in blocks]
+
+def free_gaps(blocks, start, end, min_length=timedelta(0)):
+    gaps, cursor = [], start
+    for b_start, b_end, _ in blocks:
+        if b_start > cursor and b_start - cursor >= min_length:
+            gaps.append((cursor, min(b_start, end)))
+        cursor = max(cursor, b_end)
+    if end > cursor and end - cursor >= min_length:
+        gaps.append((cursor, end))
+    return gaps
+
+def _sweep(slots):
+    """Index pairs (i, j), i < j, of overlapping slots (sorted input): heap of active ends."""
+    active = []  # (end, index)
+    for j, s in enumerate(slots):
+        while active and active[0][0] <= s.start:
+            heapq.heappop(active)
+        for _, i in active:
+            yield i, j
+        heapq.heappush(active, (s.end, j))
+
+def overlapping_pairs(slots):
+    """Every pair of overlapping slots, from slots sorted by start."""
+    return [(slots[i], slots[j]) for i, j in _sweep(slots)]
+
+def conflicts_for(candidates, start, end, exclude_event=None, include_tasks=True):
+    """Slots in [start, end) overlapping any of `candidates` (Slots), other than event `exclude_event`."""
+    others = [s for s in busy_slots(start, end, include_tasks)
+              if not (s.kind == 'event' and exclude_event is not None and str(s.ref).split('@')[0] == str(exclude_event))]
+    merged = sorted([(s, True) for s in candidates] + [(s, False) for s in others],
+                    key=lambda p: (p[0].start, p[0].end))
+    slots = [s for s, _ in merged]
+    hits = {}
+    for i, j in _sweep(slots):
+        if merged[i][1] != merged[j][1]:
+            other = slots[j] if merged[i][1] else slots[i]
+            hits[(other.kind, other.ref)] = other
+    return sorted(hits.values(), key=lambda s: s.start)
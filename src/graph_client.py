@@ -0,0 +1,74 @@
+import random, threading, time
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+# Thin Microsoft Graph client: one keep-alive session (sized connection pool, gzip),
+# @odata.nextLink paging, and Retry-After aware backoff for throttled (429/503/504) calls.
+
+GRAPH_BASE = "https://graph.microsoft.com/v1.0"
+RETRY_STATUSES = {429, 503, 504}
+
+class GraphError(Exception):
+    def __init__(self, status, text):
+        super().__init__(f"Graph HTTP {status}: {text[:300]}")
+        self.status = status
+        self.text = text
+
+class GraphClient:
+    def __init__(self, pool_size=10, max_retries=4, max_backoff=30, timeout=20, session=None):
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip, deflate"})
+
+    def _delay(self, resp, attempt):
+        retry_after = resp.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        return min(2 ** attempt + random.random(), self.max_backoff)
+
+    def request(self, method, url, token, headers=None, **kw):
+        if not url.startswith("http"):
+            url = GRAPH_BASE + url
+        hdrs = {"Authorization": f"Bearer {token}", **(headers or {})}
+        kw.setdefault("timeout", self.timeout)
+        for attempt in range(self.max_retries + 1):
+            resp = self.session.request(method, url, headers=hdrs, **kw)
+            if resp.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                break
+            time.sleep(self._delay(resp, attempt))
+        if resp.status_code >= 400:
+            raise GraphError(resp.status_code, resp.text)
+        return resp
+
+    def get_json(self, url, token, **kw):
+        return self.request("GET", url, token, **kw).json()
+
+    def pages(self, url, token, top=None, headers=None):
+        """Yield each page (dict) of a collection, following @odata.nextLink.
+
+        The last page carries @odata.deltaLink for delta queries.
+        """
+        params = {"$top": top} if top else None
+        while url:
+            data = self.get_json(url, token, headers=headers, params=params)
+            yield data
+            url, params = data.get("@odata.nextLink"), None  # nextLink already carries the query
+
+_client = None
+_client_lock = threading.Lock()
+
+def graph_client() -> GraphClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GraphClient(pool_size=int(current_app.config.get('GRAPH_POOL_SIZE', 10)))
+        return _client
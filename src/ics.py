@@ -0,0 +1,338 @@
+import io
+from datetime import datetime, date, timedelta, timezone
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import select, insert, update, delete, text
+from .extensions import db
+from .models import Event, EventOverride
+from .recurrence import (parse_rrule, series_end, parse_exdates, format_exdates, invalidate_occurrences,
+                         WEEKDAYS)
+
+# iCalendar (RFC 5545) in and out of the event table. Export is a generator over a
+# yield_per query, so memory stays flat however many events there are. Import reads the
+# upload line by line and writes Event rows in batches (one transaction per batch),
+# matching existing rows by UID, so re-importing the same file updates instead of duplicating.
+# Event times are stored as naive local time, so they are exported as floating local times
+# (no Z / TZID) and every RRULE is kept in that same frame: UNTIL as local time, and BYDAY
+# moved when an imported UTC / TZID start falls on another local day.
+
+IMPORT_BATCH = 1000
+PRODID = '-//PMS//Calendar//EN'
+
+# --- export ----------------------------------------------------------------------------
+
+def _escape(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+def _fold(line):
+    # content lines are at most 75 octets; continuation lines start with a space
+    raw = line.encode('utf-8')
+    if len(raw) <= 75:
+        return line + '\r\n'
+    parts, cur = [], b''
+    for ch in line:
+        b = ch.encode('utf-8')
+        if len(cur) + len(b) > (75 if not parts else 74):
+            parts.append(cur.decode('utf-8'))
+            cur = b''
+        cur += b
+    parts.append(cur.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+def _floating(dt):
+    return dt.strftime('%Y%m%dT%H%M%S')  # naive local time, as stored
+
+def _stamp(dt):
+    return dt.strftime('%Y%m%dT%H%M%SZ')  # created_at / updated_at are naive UTC
+
+def local_rrule(rrule, shift=0):
+    """`rrule` in the floating local frame of its DTSTART: UNTIL as local time and BYDAY moved
+    by `shift` days (DTSTART's local date minus the date it was written with). None when the
+    rule cannot be moved that way (ordinal BYDAY, BYMONTHDAY)."""
+    until = parse_rrule(rrule)['until']
+    parts = []
+    for part in rrule.split(';'):
+        key, _, value = part.partition('=')
+        key = key.strip().upper()
+        if key == 'UNTIL' and until is not None and value.strip().upper().endswith('Z'):
+            value = _floating(until)
+        elif shift and key == 'BYDAY':
+            days = []
+            for item in value.split(','):
+                item = item.strip().upper()
+                if item[:-2] not in ('', '+'):
+                    return None
+                days.append(WEEKDAYS[(WEEKDAYS.index(item[-2:]) + shift) % 7])
+            value = ','.join(days)
+        elif shift and key == 'BYMONTHDAY':
+            return None
+        parts.append(f'{key}={value}')
+    return ';'.join(parts)
+
+def _vevent(uid, stamp, start, end, title, location, description, rrule=None, exdates=None, rid=None):
+    lines = ['BEGIN:VEVENT', f'UID:{_escape(uid)}', f'DTSTAMP:{_stamp(stamp)}']
+    if rid is not None:
+        lines.append(f'RECURRENCE-ID:{_floating(rid)}')
+    lines.append(f'DTSTART:{_floating(start)}')
+    if end is not None:
+        lines.append(f'DTEND:{_floating(end)}')
+    if title:
+        lines.append(f'SUMMARY:{_escape(title)}')
+    if location:
+        lines.append(f'LOCATION:{_escape(location)}')
+    if description:
+        lines.append(f'DESCRIPTION:{_escape(description)}')
+    if rrule:
+        lines.append(f'RRULE:{local_rrule(rrule)}')
+    if exdates:
+        lines.append('EXDATE:' + ','.join(_floating(d) for d in sorted(exdates)))
+    lines.append('END:VEVENT')
+    return ''.join(_fold(l) for l in lines)
+
+def ensure_event_uids():
+    """Give pre-UID events a stable UID at startup (new events get one on insert), so the
+    export stays read-only."""
+    db.session.execute(text("UPDATE event SET uid = 'event-' || id || '@pms' WHERE uid IS NULL"))
+    db.session.commit()
+
+def export_ics(chunk_rows=500):
+    """Yield the whole calendar as iCalendar text, a few hundred events per chunk."""
+    yield ''.join(_fold(l) for l in ('BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}', 'CALSCALE:GREGORIAN'))
+    cols = (Event.uid, Event.updated_at, Event.start_at, Event.end_at, Event.title, Event.location,
+            Event.description, Event.rrule, Event.exdates)
+    buf = []
+    rows = db.session.execute(select(*cols).where(Event.start_at.isnot(None)).order_by(Event.id)
+                              .execution_options(yield_per=chunk_rows))
+    for r in rows:
+        buf.append(_vevent(r.uid, r.updated_at, r.start_at, r.end_at, r.title, r.location, r.description,
+                           r.rrule, parse_exdates(r.exdates) if r.rrule else None))
+        if len(buf) >= chunk_rows:
+            yield ''.join(buf)
+            buf = []
+    ov_rows = db.session.execute(
+        select(Event.uid, Event.start_at, Event.end_at, Event.title, Event.location, Event.description,
+               EventOverride.recurrence_id, EventOverride.updated_at, EventOverride.title.label('o_title'),
+               EventOverride.start_at.label('o_start'), EventOverride.end_at.label('o_end'),
+               EventOverride.location.label('o_location'), EventOverride.description.label('o_description'))
+        .join(Event, Event.id == EventOverride.event_id).order_by(EventOverride.id)
+        .execution_options(yield_per=chunk_rows))
+    for r in ov_rows:
+        start = r.o_start or r.recurrence_id
+        end = r.o_end or (start + (r.end_at - r.start_at) if r.end_at and r.start_at else None)
+        buf.append(_vevent(r.uid, r.updated_at, start, end, r.o_title or r.title, r.o_location or r.location,
+                           r.o_description or r.description, rid=r.recurrence_id))
+        if len(buf) >= chunk_rows:
+            yield ''.join(buf)
+            buf = []
+    buf.append(_fold('END:VCALENDAR'))
+    yield ''.join(buf)
+
+# --- import ----------------------------------------------------------------------------
+
+def _unfold(lines):
+    cur = None
+    for raw in lines:
+        line = raw.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and cur is not None:
+            cur += line[1:]
+            continue
+        if cur is not None:
+            yield cur
+        cur = line
+    if cur:
+        yield cur
+
+def _split(line):
+    """'DTSTART;TZID=Europe/Paris:20250101T090000' -> ('DTSTART', {'TZID': ...}, value)."""
+    head, sep, value = line.partition(':')
+    # a quoted parameter value may contain ':'
+    while head.count('"') % 2 and sep:
+        more, sep, value = value.partition(':')
+        head += ':' + more
+    name, *params = head.split(';')
+    return name.upper(), dict(p.split('=', 1) for p in params if '=' in p), value
+
+def _unescape(value):
+    out, i = [], 0
+    while i < len(value):
+        ch = value[i]
+        if ch == '\\' and i + 1 < len(value):
+            nxt = value[i + 1]
+            out.append('\n' if nxt in 'nN' else nxt)
+            i += 2
+        else:
+            out.append(ch)
+            i += 1
+    return ''.join(out)
+
+def _parse_dt(value, params):
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return datetime.combine(date(int(value[:4]), int(value[4:6]), int(value[6:8])), datetime.min.time())
+    if len(value) < 15 or value[8] != 'T':
+        raise ValueError(f'Bad date-time: {value}')
+    # slicing is several times faster than strptime, which dominates large imports
+    dt = datetime(int(value[:4]), int(value[4:6]), int(value[6:8]),
+                  int(value[9:11]), int(value[11:13]), int(value[13:15]))
+    if value.endswith('Z'):
+        dt = dt.replace(tzinfo=timezone.utc)
+    else:
+        tzid = params.get('TZID', '').strip('"')
+        if tzid:
+            try:
+                dt = dt.replace(tzinfo=ZoneInfo(tzid))
+            except (ZoneInfoNotFoundError, ValueError):
+                pass
+    return dt.astimezone().replace(tzinfo=None) if dt.tzinfo else dt
+
+_CLOCK_UNITS = {'H': 'hours', 'M': 'minutes', 'S': 'seconds'}
+
+def _parse_duration(value):
+    sign = -1 if value.startswith('-') else 1
+    value = value.lstrip('+-').removeprefix('P')
+    days, _, clock = value.partition('T')
+    total = timedelta()
+    num = ''
+    for ch in days:
+        if ch.isdigit():
+            num += ch
+        else:
+            total += timedelta(weeks=int(num)) if ch == 'W' else timedelta(days=int(num))
+            num = ''
+    for ch in clock:
+        if ch.isdigit():
+            num += ch
+        else:
+            total += timedelta(**{_CLOCK_UNITS[ch]: int(num)})
+            num = ''
+    return sign * total
+
+def iter_vevents(lines):
+    """Parsed VEVENTs (dicts) from an iterable of iCalendar lines, one at a time."""
+    ev = None
+    depth = 0  # skip VALARM etc. nested inside a VEVENT
+    for line in _unfold(lines):
+        if not line:
+            continue
+        name, params, value = _split(line)
+        if name == 'BEGIN':
+            if value.upper() == 'VEVENT' and ev is None:
+                ev = {'exdates': set()}
+            elif ev is not None:
+                depth += 1
+            continue
+        if name == 'END':
+            if ev is not None and depth:
+                depth -= 1
+            elif ev is not None and value.upper() == 'VEVENT':
+                yield ev
+                ev = None
+            continue
+        if ev is None or depth:
+            continue
+        try:
+            if name == 'UID':
+                ev['uid'] = value.strip()
+            elif name == 'SUMMARY':
+                ev['title'] = _unescape(value)
+            elif name == 'LOCATION':
+                ev['location'] = _unescape(value)
+            elif name == 'DESCRIPTION':
+                ev['description'] = _unescape(value)
+            elif name == 'DTSTART':
+                ev['start_at'] = _parse_dt(value, params)
+                # a UTC / TZID start can land on another local day; BYDAY must follow it
+                written = date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+                ev['start_shift'] = (ev['start_at'].date() - written).days
+            elif name == 'DTEND':
+                ev['end_at'] = _parse_dt(value, params)
+            elif name == 'DURATION':
+                ev['duration'] = _parse_duration(value)
+            elif name == 'RRULE':
+                ev['rrule'] = value.strip()
+            elif name == 'EXDATE':
+                ev['exdates'].update(_parse_dt(v, params) for v in value.split(',') if v.strip())
+            elif name == 'RECURRENCE-ID':
+                ev['recurrence_id'] = _parse_dt(value, params)
+        except (ValueError, KeyError):
+            ev['invalid'] = True
+
+def _event_row(ev):
+    start = ev.get('start_at')
+    if start is None or ev.get('invalid') or not ev.get('uid'):
+        return None
+    end = ev.get('end_at') or (start + ev['duration'] if ev.get('duration') else None)
+    rrule = ev.get('rrule')
+    if rrule:
+        try:
+            rrule = local_rrule(rrule, ev.get('start_shift', 0))
+        except ValueError:
+            rrule = None  # outside the supported subset: keep the first occurrence
+    row = {'uid': ev['uid'][:255], 'title': (ev.get('title') or '(no title)')[:200], 'start_at': start,
+           'end_at': end, 'location': (ev.get('location') or '')[:255] or None,
+           'description': ev.get('description') or None, 'rrule': rrule,
+           'exdates': format_exdates(ev['exdates']) if rrule else None}
+    row['recur_until'] = series_end(SimpleNamespace(**row)) if rrule else None
+    return row
+
+def _write_batch(rows, stats):
+    by_uid = {r['uid']: r for r in rows}  # last one wins inside the batch
+    existing = dict(db.session.execute(select(Event.uid, Event.id).where(Event.uid.in_(list(by_uid)))).all())
+    now = datetime.utcnow()
+    new = [{**r, 'created_at': now, 'updated_at': now} for uid, r in by_uid.items() if uid not in existing]
+    changed = [{**r, 'id': existing[uid], 'updated_at': now} for uid, r in by_uid.items() if uid in existing]
+    if new:
+        db.session.execute(insert(Event), new)
+    if changed:
+        db.session.execute(update(Event), changed)
+    db.session.commit()
+    stats['created'] += len(new)
+    stats['updated'] += len(changed)
+
+def _write_overrides(overrides, stats):
+    uids = list({uid for uid, _ in overrides})
+    ids = {}
+    for i in range(0, len(uids), IMPORT_BATCH):
+        ids.update(db.session.execute(select(Event.uid, Event.id).where(Event.uid.in_(uids[i:i + IMPORT_BATCH]))).all())
+    rows = []
+    for uid, ev in overrides:
+        if uid not in ids or ev.get('start_at') is None:
+            stats['skipped'] += 1
+            continue
+        rows.append({'event_id': ids[uid], 'recurrence_id': ev['recurrence_id'], 'title': ev.get('title'),
+                     'start_at': ev['start_at'], 'end_at': ev.get('end_at'), 'location': ev.get('location'),
+                     'description': ev.get('description')})
+    for i in range(0, len(rows), IMPORT_BATCH):
+        chunk = rows[i:i + IMPORT_BATCH]
+        for r in chunk:
+            db.session.execute(delete(EventOverride).where(EventOverride.event_id == r['event_id'],
+                                                           EventOverride.recurrence_id == r['recurrence_id']))
+        now = datetime.utcnow()
+        db.session.execute(insert(EventOverride), [{**r, 'created_at': now, 'updated_at': now} for r in chunk])
+        db.session.execute(update(Event).where(Event.id.in_({r['event_id'] for r in chunk})).values(updated_at=now))
+        db.session.commit()
+    stats['overrides'] += len(rows)
+
+def import_ics(stream, batch_size=IMPORT_BATCH):
+    """Import an iCalendar byte stream; returns counts {created, updated, overrides, skipped}."""
+    stats = {'created': 0, 'updated': 0, 'overrides': 0, 'skipped': 0}
+    lines = io.TextIOWrapper(stream, encoding='utf-8', errors='replace', newline='')
+    batch, overrides = [], []
+    for ev in iter_vevents(lines):
+        if ev.get('recurrence_id') and ev.get('uid') and not ev.get('invalid'):
+            overrides.append((ev['uid'], ev))  # applied once their series are in
+            continue
+        row = _event_row(ev)
+        if row is None:
+            stats['skipped'] += 1
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _write_batch(batch, stats)
+            batch = []
+    if batch:
+        _write_batch(batch, stats)
+    if overrides:
+        _write_overrides(overrides, stats)
+    invalidate_occurrences()
+    return stats
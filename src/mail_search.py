@@ -0,0 +1,84 @@
+import re
+from markupsafe import escape, Markup
+from sqlalchemy import text
+from .extensions import db
+
+# SQLite FTS5 index over the local mail index (subject, sender, snippet). It is an
+# external-content table on mail_message, kept current by triggers, so whatever the sync
+# inserts, updates or deletes is searchable immediately -- no provider calls.
+
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS mail_fts USING fts5(
+        subject, sender, snippet,
+        content='mail_message', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS mail_message_fts_ai AFTER INSERT ON mail_message BEGIN
+        INSERT INTO mail_fts(rowid, subject, sender, snippet) VALUES (new.id, new.subject, new.sender, new.snippet);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS mail_message_fts_ad AFTER DELETE ON mail_message BEGIN
+        INSERT INTO mail_fts(mail_fts, rowid, subject, sender, snippet) VALUES ('delete', old.id, old.subject, old.sender, old.snippet);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS mail_message_fts_au AFTER UPDATE OF subject, sender, snippet ON mail_message BEGIN
+        INSERT INTO mail_fts(mail_fts, rowid, subject, sender, snippet) VALUES ('delete', old.id, old.subject, old.sender, old.snippet);
+        INSERT INTO mail_fts(rowid, subject, sender, snippet) VALUES (new.id, new.subject, new.sender, new.snippet);
+    END""",
+]
+
+def ensure_mail_fts(engine=None):
+    engine = engine or db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.begin() as conn:
+        existed = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'mail_fts'")).first()
+        for ddl in FTS_DDL:
+            conn.execute(text(ddl))
+        if not existed:
+            # index mail that was synced before the FTS table existed
+            conn.execute(text("INSERT INTO mail_fts(mail_fts) VALUES ('rebuild')"))
+
+_TERM = re.compile(r'\w+\*?', re.UNICODE)
+
+def fts_query(q: str, prefix: bool = False) -> str:
+    """User input -> safe FTS5 MATCH expression: terms ANDed, quoted; `term*` is a prefix query.
+
+    With `prefix`, every term is a prefix query.
+    """
+    terms = []
+    for tok in _TERM.findall(q or ''):
+        word = tok.rstrip('*').replace('"', '')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix or tok.endswith('*') else ''))
+    return ' '.join(terms)
+
+def highlight(s: str) -> Markup:
+    # snippet() marks hits with \x02..\x03; escape the mail text first, then add <mark>
+    return Markup(str(escape(s or '')).replace('\x02', '<mark>').replace('\x03', '</mark>'))
+
+def search_mail(q: str, provider: str | None = None, account: str | None = None, limit=50, offset=0):
+    """Ranked (bm25; subject > sender > snippet) hits as dicts, best first."""
+    match = fts_query(q)
+    if not match:
+        return []
+    sql = """
+        SELECT m.id, m.provider, m.account, m.open_url, m.date, m.received_at,
+               highlight(mail_fts, 0, char(2), char(3)) AS subject,
+               highlight(mail_fts, 1, char(2), char(3)) AS sender,
+               snippet(mail_fts, 2, char(2), char(3), '…', 16) AS snippet
+        FROM mail_fts JOIN mail_message m ON m.id = mail_fts.rowid
+        WHERE mail_fts MATCH :match
+    """
+    params = {"match": match, "limit": limit, "offset": offset}
+    if provider:
+        sql += " AND m.provider = :provider"
+        params["provider"] = provider
+    if account:
+        sql += " AND m.account = :account"
+        params["account"] = account
+    sql += " ORDER BY bm25(mail_fts, 10.0, 4.0, 1.0) LIMIT :limit OFFSET :offset"
+    hits = []
+    for r in db.session.execute(text(sql), params).mappings():
+        hit = dict(r)
+        for k in ('subject', 'sender', 'snippet'):
+            hit[k] = highlight(hit[k])
+        hits.append(hit)
+    return hits
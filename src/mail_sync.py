@@ -0,0 +1,660 @@
+import os, json, time, pathlib, datetime, threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from flask import current_app
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from google.auth.transport.requests import Request
+import msal
+from msal import SerializableTokenCache
+from .extensions import db
+from .graph_client import graph_client, GraphError
+from .mail_threads import thread_key, refresh_conversations
+from .notify import publish
+from .models import GmailAccount, OutlookAccount, MailMessage, MailSyncState, MailConversation
+
+# Provider fetches run here (scheduler job / explicit "sync now"), never on a page view.
+# Each fetcher returns MailRecords; the timestamp is parsed once, at ingest.
+
+PAGE_SIZE = 50  # provider page size; the per-account cap is EMAIL_SYNC_MAX_MESSAGES
+
+# --- Gmail ---
+G_SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+
+def _g_client_secrets_path():
+    return current_app.config.get('GOOGLE_CLIENT_SECRETS')
+
+def _g_token_dir():
+    return pathlib.Path(current_app.config.get('GOOGLE_TOKEN_DIR'))
+
+def _g_token_path_for(email):
+    safe = email.replace('@','_at_').replace('.','_')
+    return _g_token_dir() / f"token_{safe}.json"
+
+def _g_load_credentials(token_path: pathlib.Path) -> Credentials | None:
+    if not token_path.exists():
+        return None
+    creds = Credentials.from_authorized_user_file(str(token_path), G_SCOPES)
+    if creds and creds.expired and creds.refresh_token:
+        try:
+            creds.refresh(Request())
+            token_path.write_text(creds.to_json())
+        except Exception as ex:
+            print("Credential refresh failed:", ex)
+    return creds
+
+# --- Outlook (Microsoft 365 via Graph) ---
+O_SCOPES = ['openid', 'profile', 'offline_access', 'email', 'Mail.Read']
+
+def _o_app_config_path():
+    return current_app.config.get('OUTLOOK_APP_CONFIG')
+
+def _o_token_dir():
+    return pathlib.Path(current_app.config.get('OUTLOOK_TOKEN_DIR'))
+
+def _o_token_path_for(email):
+    safe = email.replace('@','_at_').replace('.','_')
+    return _o_token_dir() / f"token_{safe}.bin"
+
+def _o_load_app_and_cache(for_email: str | None = None):
+    cfg_path = _o_app_config_path()
+    if not os.path.exists(cfg_path):
+        return None, None, "Missing Outlook app config. Create: " + cfg_path
+    try:
+        cfg = json.loads(pathlib.Path(cfg_path).read_text())
+        client_id = cfg['client_id']
+        client_secret = cfg['client_secret']
+        tenant = cfg.get('tenant', 'common')
+    except Exception as ex:
+        return None, None, f"Invalid app_config.json: {ex}"
+    authority = f"https://login.microsoftonline.com/{tenant}"
+    cache = SerializableTokenCache()
+    if for_email:
+        tpath = _o_token_path_for(for_email)
+        if tpath.exists():
+            cache.deserialize(tpath.read_text())
+    app = msal.ConfidentialClientApplication(
+        client_id=client_id,
+        client_credential=client_secret,
+        authority=authority,
+        token_cache=cache
+    )
+    return app, cache, None
+
+def _o_save_cache(email: str, cache: SerializableTokenCache):
+    if cache.has_state_changed:
+        tpath = _o_token_path_for(email)
+        tpath.parent.mkdir(parents=True, exist_ok=True)
+        tpath.write_text(cache.serialize())
+
+# --- Credential / client cache ---
+# Credentials, Gmail service objects and MSAL apps are built once per account and reused
+# until the TTL lapses, the account is removed or its token file changes. refresh_tokens_job
+# renews tokens ahead of expiry, so a sync never has to wait on an OAuth refresh or token
+# file I/O. Every process stats the token file on use: a reconnect in the web process
+# rewrites it, and the worker drops its client instead of syncing with (or writing back)
+# the old credentials.
+TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=10)
+_clients = {}  # (provider, email) -> (expires_at monotonic, token file mtime_ns, client)
+_clients_lock = threading.Lock()
+
+def _mtime(path: pathlib.Path):
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+def _cached_client(key, token_path: pathlib.Path, loader):
+    now = time.monotonic()
+    mtime = _mtime(token_path)
+    with _clients_lock:
+        hit = _clients.get(key)
+        if hit and hit[0] > now and hit[1] == mtime:
+            return hit[2]
+    client = loader()
+    if client is not None:
+        ttl = int(current_app.config.get('EMAIL_CLIENT_TTL_SECONDS', 1800))
+        with _clients_lock:
+            # the loader may have refreshed and saved the token itself
+            _clients[key] = (now + ttl, _mtime(token_path), client)
+    return client
+
+def invalidate_client(provider: str, email: str):
+    with _clients_lock:
+        _clients.pop((provider, email), None)
+
+def _save_token(key, token_path: pathlib.Path, text: str):
+    """Write back a cached client's token -- unless the file changed since it was loaded.
+
+    Returns False (and drops the client, so the next use reloads) if it did.
+    """
+    with _clients_lock:
+        hit = _clients.get(key)
+        if hit is None or hit[1] != _mtime(token_path):
+            _clients.pop(key, None)
+            print(f"[MailSync] Token for {key[1]} changed on disk; not writing back the old one")
+            return False
+        token_path.parent.mkdir(parents=True, exist_ok=True)
+        token_path.write_text(text)
+        _clients[key] = (hit[0], _mtime(token_path), hit[2])
+        return True
+
+def _g_client(acc: GmailAccount):
+    """(creds, service, token_path) for a Gmail account, or None if it has no token."""
+    token_path = pathlib.Path(acc.token_path)
+    def load():
+        creds = _g_load_credentials(token_path)
+        if not creds:
+            return None
+        return creds, build('gmail', 'v1', credentials=creds, cache_discovery=False), token_path
+    return _cached_client(('gmail', acc.email), token_path, load)
+
+def _g_refresh(email: str, creds: Credentials, token_path: pathlib.Path):
+    creds.refresh(Request())
+    _save_token(('gmail', email), token_path, creds.to_json())
+
+def _o_client(email: str):
+    """(msal app, token cache) for an Outlook account."""
+    def load():
+        app, cache, err = _o_load_app_and_cache(for_email=email)
+        if err:
+            raise SyncError(err)
+        return app, cache
+    return _cached_client(('outlook', email), _o_token_path_for(email), load)
+
+def _o_save_client_cache(email: str, cache: SerializableTokenCache):
+    if cache.has_state_changed:
+        _save_token(('outlook', email), _o_token_path_for(email), cache.serialize())
+
+def _o_token_expires_at(cache: SerializableTokenCache, account) -> float:
+    ats = cache.find(msal.TokenCache.CredentialType.ACCESS_TOKEN,
+                     query={"home_account_id": account.get("home_account_id")})
+    return max((int(a.get('expires_on', 0)) for a in ats), default=0)
+
+# --- Fetchers ---
+class SyncError(Exception):
+    pass
+
+def parse_date_generic(d):
+    """RFC 2822 or ISO 8601 -> UTC epoch seconds (None if unparseable)."""
+    if not d:
+        return None
+    try:
+        dt = parsedate_to_datetime(d)
+    except Exception:
+        try:
+            dt = datetime.datetime.fromisoformat(d.replace('Z','+00:00'))
+        except Exception:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+class MailRecord:
+    """One normalized message, as fetchers emit it and the inbox renders it.
+
+    Slotted to keep large windows compact; `ts` (UTC epoch seconds) is parsed once, at ingest.
+    """
+    __slots__ = ('message_id', 'thread_id', 'open_url', 'sender', 'subject', 'snippet', 'date', 'ts',
+                 'provider', 'account', 'id')
+
+    def __init__(self, message_id, thread_id, open_url, sender, subject, snippet, date, ts,
+                 provider=None, account=None, id=None):
+        self.message_id = message_id
+        self.thread_id = thread_id
+        self.open_url = open_url
+        self.sender = sender
+        self.subject = subject
+        self.snippet = snippet
+        self.date = date
+        self.ts = ts
+        self.provider = provider
+        self.account = account
+        self.id = id
+
+    @property
+    def received_at(self):
+        # naive UTC, as stored in MailMessage.received_at
+        if self.ts is None:
+            return None
+        return datetime.datetime.fromtimestamp(self.ts, datetime.timezone.utc).replace(tzinfo=None)
+
+    @classmethod
+    def from_row(cls, row):
+        """Build from a RECORD_COLUMNS row (a plain tuple -- no ORM instance per message)."""
+        rid, provider, account, message_id, thread_id, open_url, sender, subject, snippet, date, received_at = row
+        ts = received_at.replace(tzinfo=datetime.timezone.utc).timestamp() if received_at else None
+        return cls(message_id, thread_id, open_url, sender, subject, snippet, date, ts,
+                   provider=provider, account=account, id=rid)
+
+RECORD_COLUMNS = (MailMessage.id, MailMessage.provider, MailMessage.account, MailMessage.message_id,
+                  MailMessage.thread_id, MailMessage.open_url, MailMessage.sender, MailMessage.subject,
+                  MailMessage.snippet, MailMessage.date, MailMessage.received_at)
+
+G_METADATA_HEADERS = ['From','Subject','Date']
+G_BATCH_RETRIES = 3
+
+def _g_retriable(ex):
+    if not isinstance(ex, HttpError):
+        return True
+    status = getattr(ex, 'status_code', None) or ex.resp.status
+    return status == 429 or status >= 500 or (status == 403 and 'ateLimit' in str(ex))
+
+def g_get_metadata(service, msg_ids, batch_size=50):
+    """messages.get(format=metadata) for many ids, packed into batch requests.
+
+    Failed parts are retried (with backoff) in a smaller follow-up batch; parts that
+    still fail, or fail permanently (e.g. 404 for a message deleted meanwhile), are dropped.
+    Returns the messages in msg_ids order.
+    """
+    found = {}
+    pending = list(msg_ids)
+    for attempt in range(G_BATCH_RETRIES + 1):
+        retry = []
+
+        def on_part(request_id, response, exception):
+            if exception is None:
+                found[request_id] = response
+            elif _g_retriable(exception):
+                retry.append(request_id)
+            else:
+                print(f"Gmail get {request_id} failed:", exception)
+
+        for i in range(0, len(pending), batch_size):
+            batch = service.new_batch_http_request(callback=on_part)
+            for mid in pending[i:i + batch_size]:
+                batch.add(service.users().messages().get(userId='me', id=mid, format='metadata',
+                    metadataHeaders=G_METADATA_HEADERS), request_id=mid)
+            batch.execute()
+        if not retry:
+            break
+        pending = retry
+        if attempt < G_BATCH_RETRIES:
+            time.sleep(min(0.5 * 2 ** attempt, 8))
+    else:
+        print(f"Gmail get gave up on {len(pending)} message(s) after {G_BATCH_RETRIES} retries")
+    return [found[mid] for mid in msg_ids if mid in found]
+
+def _g_item(acc_email, m):
+    headers = {h['name']: h['value'] for h in m.get('payload', {}).get('headers', [])}
+    thread_id = m.get('threadId')
+    if m.get('internalDate'):
+        ts = int(m['internalDate']) / 1000
+    else:
+        ts = parse_date_generic(headers.get('Date'))
+    return MailRecord(
+        message_id=m['id'],
+        thread_id=thread_id,
+        open_url=f"https://mail.google.com/mail/?authuser={acc_email}#all/{thread_id}",
+        sender=headers.get('From',''),
+        subject=headers.get('Subject','(no subject)'),
+        snippet=m.get('snippet',''),
+        date=headers.get('Date',''),
+        ts=ts,
+    )
+
+G_HIDDEN_LABELS = {'SPAM', 'TRASH'}
+
+def _g_history_changes(service, start_history_id):
+    """Walk users.history since start_history_id -> (added ids, removed ids, new historyId)."""
+    added, removed = [], set()
+    page_token, latest = None, start_history_id
+    while True:
+        resp = service.users().history().list(userId='me', startHistoryId=start_history_id,
+            historyTypes=['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved'],
+            pageToken=page_token).execute()
+        latest = resp.get('historyId', latest)
+        for h in resp.get('history', []):
+            restored = [rec for rec in h.get('labelsRemoved', [])
+                        if not G_HIDDEN_LABELS.isdisjoint(rec.get('labelIds', []))]
+            for rec in h.get('messagesAdded', []) + restored:
+                m = rec['message']
+                if G_HIDDEN_LABELS.isdisjoint(m.get('labelIds', [])):
+                    added.append(m['id'])
+                    removed.discard(m['id'])
+            for rec in h.get('messagesDeleted', []):
+                removed.add(rec['message']['id'])
+            for rec in h.get('labelsAdded', []):
+                if not G_HIDDEN_LABELS.isdisjoint(rec.get('labelIds', [])):
+                    removed.add(rec['message']['id'])
+        page_token = resp.get('nextPageToken')
+        if not page_token:
+            break
+    added = [mid for mid in dict.fromkeys(added) if mid not in removed]
+    return added, removed, latest
+
+def fetch_gmail(acc: GmailAccount, lookback_days: int, cursor: str | None = None):
+    client = _g_client(acc)
+    if not client:
+        raise SyncError(f"Gmail token missing for {acc.email}. Reconnect.")
+    creds, service, token_path = client
+    if creds.expired and creds.refresh_token:
+        _g_refresh(acc.email, creds, token_path)  # only if refresh_tokens_job fell behind
+    batch_size = int(current_app.config.get('EMAIL_GMAIL_BATCH_SIZE', 50))
+
+    if cursor:
+        try:
+            added, removed, history_id = _g_history_changes(service, cursor)
+            items = [_g_item(acc.email, m) for m in g_get_metadata(service, added, batch_size=batch_size)]
+            return {"items": items, "removed": removed, "full": False, "cursor": str(history_id)}
+        except HttpError as ex:
+            if ex.resp.status != 404:  # 404 = historyId too old; fall through to a full resync
+                raise
+
+    # Take the historyId before listing so nothing that lands mid-sync is missed.
+    history_id = service.users().getProfile(userId='me').execute().get('historyId')
+    q = f"newer_than:{lookback_days}d -category:spam -in:trash"
+    limit = int(current_app.config.get('EMAIL_SYNC_MAX_MESSAGES', 500))
+    msg_ids, page_token = [], None
+    while len(msg_ids) < limit:
+        resp = service.users().messages().list(userId='me', q=q, pageToken=page_token,
+            maxResults=min(500, limit - len(msg_ids))).execute()
+        msg_ids += [m['id'] for m in resp.get('messages', [])]
+        page_token = resp.get('nextPageToken')
+        if not page_token:
+            break
+    items = [_g_item(acc.email, m) for m in g_get_metadata(service, msg_ids, batch_size=batch_size)]
+    return {"items": items, "removed": (), "full": True, "truncated": bool(page_token),
+            "cursor": str(history_id) if history_id else None}
+
+O_SELECT = "subject,from,receivedDateTime,bodyPreview,webLink,conversationId"
+
+class CursorExpired(Exception):
+    pass
+
+def _o_item(m):
+    frm = (m.get('from', {}) or {}).get('emailAddress', {})
+    return MailRecord(
+        message_id=m.get('id'),
+        thread_id=m.get('conversationId'),
+        open_url=m.get('webLink'),
+        sender=f"{frm.get('name','')} <{frm.get('address','')}>".strip(),
+        subject=m.get('subject') or "(no subject)",
+        snippet=m.get('bodyPreview', ''),
+        date=m.get('receivedDateTime', ''),
+        ts=parse_date_generic(m.get('receivedDateTime')),
+    )
+
+def _o_delta_pages(url, token, headers):
+    """Follow @odata.nextLink until the @odata.deltaLink -> (changed, removed ids, deltaLink)."""
+    items, removed, delta_link = [], set(), None
+    try:
+        for data in graph_client().pages(url, token, headers=headers):
+            for m in data.get('value', []):
+                if '@removed' in m:
+                    removed.add(m['id'])
+                else:
+                    items.append(_o_item(m))
+            delta_link = data.get('@odata.deltaLink', delta_link)
+    except GraphError as ex:
+        if ex.status == 410 or (ex.status == 400 and
+                any(code in ex.text for code in ('SyncStateNotFound', 'resyncRequired', 'syncStateInvalid'))):
+            raise CursorExpired(ex.text[:200])
+        raise
+    return items, removed, delta_link
+
+def fetch_outlook(acc: OutlookAccount, lookback_days: int, cursor: str | None = None):
+    app, cache = _o_client(acc.email)
+    # try silent token
+    result = None
+    accts = app.get_accounts(username=acc.email)
+    if accts:
+        result = app.acquire_token_silent(scopes=O_SCOPES, account=accts[0])
+    if not result:
+        raise SyncError(f"Outlook token expired for {acc.email}. Reconnect.")
+    _o_save_client_cache(acc.email, cache)
+
+    token = result['access_token']
+    headers = {"Prefer": f"odata.maxpagesize={PAGE_SIZE}"}
+    if cursor:
+        try:
+            items, removed, delta_link = _o_delta_pages(cursor, token, headers)
+            return {"items": items, "removed": removed, "full": False, "cursor": delta_link or cursor}
+        except CursorExpired:
+            pass  # fall through to a full resync
+
+    # Delta queries are per folder; the initial round enumerates the lookback window of the
+    # inbox and hands back a deltaLink that later syncs replay to get only the changes.
+    since = (datetime.datetime.utcnow() - datetime.timedelta(days=lookback_days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    url = ("/me/mailFolders/inbox/messages/delta"
+           f"?$select={O_SELECT}"
+           f"&$filter=receivedDateTime ge {since}"
+           "&$orderby=receivedDateTime desc")
+    items, _removed, delta_link = _o_delta_pages(url, token, headers)
+    return {"items": items, "removed": (), "full": True, "cursor": delta_link}
+
+# provider -> (account model, fetcher). Swap a fetcher out to sync against a fake provider.
+# fetcher(acc, lookback_days, cursor) -> {"items": [MailRecord], "removed", "full", "cursor"[, "truncated"]};
+# a full result is the whole lookback window (or its newest part, if truncated), otherwise only
+# what changed since `cursor`.
+PROVIDERS = {
+    'gmail': (GmailAccount, fetch_gmail),
+    'outlook': (OutlookAccount, fetch_outlook),
+}
+
+# --- Store ---
+def _sync_state(provider: str, account: str) -> MailSyncState:
+    st = MailSyncState.query.filter_by(provider=provider, account=account).first()
+    if not st:
+        st = MailSyncState(provider=provider, account=account)
+        db.session.add(st)
+    return st
+
+MESSAGE_FIELDS = ('thread_id', 'open_url', 'sender', 'subject', 'snippet', 'date', 'received_at')
+
+def store_messages(provider: str, account: str, result, lookback_days: int):
+    """Apply a fetch result to the index; returns the messages that were not there before."""
+    items = result['items']
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=lookback_days)
+    base = MailMessage.query.filter_by(provider=provider, account=account)
+    if result['full']:
+        existing = {m.message_id: m for m in base}
+    else:
+        ids = [it.message_id for it in items] + list(result['removed'])
+        existing = {m.message_id: m for m in base.filter(MailMessage.message_id.in_(ids))} if ids else {}
+    seen = set()
+    touched = set()  # conversation keys to recompute
+    added = []
+    for it in items:
+        seen.add(it.message_id)
+        m = existing.get(it.message_id)
+        if m is None:
+            m = MailMessage(provider=provider, account=account, message_id=it.message_id)
+            db.session.add(m)
+            added.append(m)
+        else:
+            touched.add(thread_key(m.thread_id, m.message_id))
+        for k in MESSAGE_FIELDS:
+            v = getattr(it, k)
+            if getattr(m, k) != v:
+                setattr(m, k, v)
+        touched.add(thread_key(it.thread_id, it.message_id))
+
+    def drop(m):
+        touched.add(thread_key(m.thread_id, m.message_id))
+        db.session.delete(m)
+
+    if not result['full']:
+        for mid in result['removed']:
+            if mid in existing and mid not in seen:
+                drop(existing[mid])
+        # age out of the lookback window
+        for m in base.filter(MailMessage.received_at < cutoff):
+            drop(m)
+    else:
+        # A full fetch is a relist of the window, so anything missing from it was
+        # deleted/trashed -- but if it was truncated, only trust the span it covered.
+        covered_from = cutoff
+        if result.get('truncated'):
+            stamps = [it.ts for it in items if it.ts is not None]
+            covered_from = (datetime.datetime.utcfromtimestamp(min(stamps)) if stamps
+                            else datetime.datetime.max)
+        for mid, m in existing.items():
+            if mid in seen:
+                continue
+            if m.received_at is None or m.received_at < cutoff or m.received_at >= covered_from:
+                drop(m)
+
+    db.session.flush()
+    refresh_conversations(provider, account, touched)
+    return added
+
+def sync_account(provider: str, acc, full: bool = False):
+    """Sync one account into the local index (incrementally when it has a cursor).
+
+    Returns an error string or None.
+    """
+    _model, fetcher = PROVIDERS[provider]
+    lookback_days = int(current_app.config.get('EMAIL_LOOKBACK_DAYS', 5))
+    try:
+        st = _sync_state(provider, acc.email)
+        result = fetcher(acc, lookback_days, None if full else st.cursor)
+        added = store_messages(provider, acc.email, result, lookback_days)
+        # tell open tabs (src/notify.py) when something arrived
+        new = len(added)
+        if new:
+            text = None  # the first sync of an account is a backfill: refresh the inbox, no toast
+            if st.last_synced_at is not None:
+                text = (f"New mail from {added[0].sender or 'unknown sender'}: {added[0].subject or '(no subject)'}"
+                        if new == 1 else f"{new} new messages in {acc.email}")
+            publish('mail', provider=provider, account=acc.email, new=new, text=text, level='info')
+        st.cursor = result.get('cursor')
+        st.last_synced_at = datetime.datetime.utcnow()
+        st.last_error = None
+        db.session.commit()
+        return None
+    except Exception as ex:
+        db.session.rollback()
+        label = 'Gmail' if provider == 'gmail' else 'Outlook'
+        err = str(ex) if isinstance(ex, SyncError) else f"{label} fetch failed for {acc.email}: {ex}"
+        st = _sync_state(provider, acc.email)
+        st.last_error = err
+        db.session.commit()
+        return err
+
+# --- Concurrent sync ---
+# Accounts sync in parallel on a small shared pool, each worker in its own app context.
+# Callers wait up to a deadline; whatever is still running keeps going in the background
+# and is reported as pending (the inbox shows those accounts as "still loading").
+_pool = None
+_pool_lock = threading.Lock()
+_in_flight = {}  # (provider, email) -> Future
+_in_flight_lock = threading.Lock()
+
+def _get_pool(app):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=int(app.config.get('EMAIL_FETCH_WORKERS', 4)),
+                                       thread_name_prefix='mail-sync')
+        return _pool
+
+def _sync_worker(app, provider, acc_id):
+    with app.app_context():
+        try:
+            model = PROVIDERS[provider][0]
+            acc = db.session.get(model, acc_id)
+            return sync_account(provider, acc) if acc else None
+        finally:
+            db.session.remove()
+
+def _sync_done(key, fut):
+    with _in_flight_lock:
+        if _in_flight.get(key) is fut:
+            del _in_flight[key]
+
+def _start_sync(app, provider, acc):
+    key = (provider, acc.email)
+    with _in_flight_lock:
+        fut = _in_flight.get(key)
+        if fut is not None:
+            return fut  # join the sync that is already running
+        fut = _get_pool(app).submit(_sync_worker, app, provider, acc.id)
+        _in_flight[key] = fut
+    fut.add_done_callback(lambda f: _sync_done(key, f))
+    return fut
+
+def syncing_accounts():
+    with _in_flight_lock:
+        return set(_in_flight)
+
+def sync_all(app, deadline: float | None = None, only=None):
+    """Sync every account (or the (provider, email) keys in `only`) concurrently, waiting at
+    most `deadline` seconds (None = until done).
+
+    Returns (errors, pending): per-account error messages collected from the workers, and
+    the (provider, email) keys that had not finished when the deadline passed.
+    """
+    futures = {}
+    for provider, (model, _fetcher) in PROVIDERS.items():
+        for acc in model.query.order_by(model.email.asc()).all():
+            if only is not None and (provider, acc.email) not in only:
+                continue
+            futures[(provider, acc.email)] = _start_sync(app, provider, acc)
+    wait(futures.values(), timeout=deadline)
+    errors, pending = [], []
+    for key, fut in futures.items():
+        if not fut.done():
+            pending.append(key)
+            continue
+        try:
+            err = fut.result()
+        except Exception as ex:
+            err = f"{key[0]} sync failed for {key[1]}: {ex}"
+        if err:
+            errors.append(err)
+    return errors, pending
+
+def purge_account(provider: str, account: str):
+    invalidate_client(provider, account)
+    MailMessage.query.filter_by(provider=provider, account=account).delete()
+    MailConversation.query.filter_by(provider=provider, account=account).delete()
+    MailSyncState.query.filter_by(provider=provider, account=account).delete()
+
+def sync_mail_job(app):
+    try:
+        with app.app_context():
+            errors, _pending = sync_all(app)
+            for err in errors:
+                print("[MailSync]", err)
+    except Exception as ex:
+        import traceback
+        print("[Scheduler] sync_mail failed:", ex)
+        traceback.print_exc()
+
+def refresh_tokens_job(app):
+    """Renew access tokens that expire within TOKEN_REFRESH_MARGIN (and persist them)."""
+    try:
+        with app.app_context():
+            busy = syncing_accounts()
+            soon = datetime.datetime.utcnow() + TOKEN_REFRESH_MARGIN
+            for acc in GmailAccount.query.all():
+                if ('gmail', acc.email) in busy:
+                    continue
+                try:
+                    client = _g_client(acc)
+                    if not client:
+                        continue
+                    creds, _service, token_path = client
+                    if creds.refresh_token and (creds.expiry is None or creds.expiry <= soon):
+                        _g_refresh(acc.email, creds, token_path)
+                except Exception as ex:
+                    print(f"[MailSync] Gmail token refresh failed for {acc.email}:", ex)
+            for acc in OutlookAccount.query.all():
+                if ('outlook', acc.email) in busy:
+                    continue
+                try:
+                    o_app, cache = _o_client(acc.email)
+                    accts = o_app.get_accounts(username=acc.email)
+                    if not accts:
+                        continue
+                    if _o_token_expires_at(cache, accts[0]) <= soon.replace(tzinfo=datetime.timezone.utc).timestamp():
+                        o_app.acquire_token_silent(scopes=O_SCOPES, account=accts[0], force_refresh=True)
+                        _o_save_client_cache(acc.email, cache)
+                except Exception as ex:
+                    print(f"[MailSync] Outlook token refresh failed for {acc.email}:", ex)
+    except Exception as ex:
+        import traceback
+        print("[Scheduler] refresh_mail_tokens failed:", ex)
+        traceback.print_exc()
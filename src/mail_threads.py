@@ -0,0 +1,82 @@
+from email.utils import parseaddr
+from sqlalchemy import or_, and_
+from .extensions import db
+from .models import MailMessage, MailConversation
+
+# Conversation index upkeep. The sync reports which thread keys it touched; only those
+# conversations are recomputed, from their (few) messages -- never the whole mailbox.
+
+MAX_PARTICIPANTS = 5
+_CHUNK = 500
+
+def thread_key(thread_id, message_id):
+    return thread_id or message_id
+
+def _participant(sender):
+    name, addr = parseaddr(sender or '')
+    return name or addr or (sender or '').strip()
+
+def _thread_messages(provider, account, keys):
+    by_key = {}
+    keys = list(keys)
+    for i in range(0, len(keys), _CHUNK):
+        chunk = keys[i:i + _CHUNK]
+        rows = (MailMessage.query
+                .filter_by(provider=provider, account=account)
+                .filter(or_(MailMessage.thread_id.in_(chunk),
+                            and_(MailMessage.thread_id.is_(None), MailMessage.message_id.in_(chunk))))
+                .all())
+        for m in rows:
+            by_key.setdefault(thread_key(m.thread_id, m.message_id), []).append(m)
+    return by_key
+
+def refresh_conversations(provider: str, account: str, keys):
+    """Recompute the conversation rows for `keys` (call after the message changes are flushed)."""
+    keys = {k for k in keys if k}
+    if not keys:
+        return
+    messages = _thread_messages(provider, account, keys)
+    convs = {}
+    keys_list = list(keys)
+    for i in range(0, len(keys_list), _CHUNK):
+        for c in MailConversation.query.filter_by(provider=provider, account=account).filter(
+                MailConversation.thread_key.in_(keys_list[i:i + _CHUNK])):
+            convs[c.thread_key] = c
+    for key in keys:
+        msgs = messages.get(key)
+        conv = convs.get(key)
+        if not msgs:
+            if conv is not None:
+                db.session.delete(conv)
+            continue
+        if conv is None:
+            conv = MailConversation(provider=provider, account=account, thread_key=key)
+            db.session.add(conv)
+        msgs.sort(key=lambda m: (m.received_at is not None, m.received_at, m.id), reverse=True)
+        latest = msgs[0]
+        people = []
+        for m in msgs:
+            p = _participant(m.sender)
+            if p and p not in people:
+                people.append(p)
+        conv.subject = latest.subject
+        conv.snippet = latest.snippet
+        conv.open_url = latest.open_url
+        conv.participants = ', '.join(people[:MAX_PARTICIPANTS]) + (' …' if len(people) > MAX_PARTICIPANTS else '')
+        conv.message_count = len(msgs)
+        conv.latest_message_id = latest.id
+        conv.latest_at = latest.received_at
+
+def rebuild_conversations():
+    """Build the index from scratch (first start after upgrading, or to repair it)."""
+    MailConversation.query.delete()
+    pairs = db.session.query(MailMessage.provider, MailMessage.account).distinct().all()
+    for provider, account in pairs:
+        keys = {thread_key(t, m) for t, m in db.session.query(MailMessage.thread_id, MailMessage.message_id)
+                .filter_by(provider=provider, account=account)}
+        refresh_conversations(provider, account, keys)
+    db.session.commit()
+
+def ensure_conversation_index():
+    if MailConversation.query.first() is None and MailMessage.query.first() is not None:
+        rebuild_conversations()
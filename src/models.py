@@ -1,7 +1,8 @@
 from datetime import datetime
+from uuid import uuid4
 from flask_login import UserMixin
-from sqlalchemy import Integer, String, DateTime, Text, ForeignKey, Table, Column
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import Integer, String, DateTime, Text, ForeignKey, Table, Column, UniqueConstraint, Index, event, update
+from sqlalchemy.orm import Mapped, mapped_column, relationship, selectinload, raiseload, Session
 from .extensions import db
 
 class TimestampMixin:
@@ -30,7 +31,8 @@ class Note(db.Model, TimestampMixin):
 task_tags = Table(
     'task_tags', db.metadata,
     Column('task_id', Integer, ForeignKey('task.id'), primary_key=True),
-    Column('tag_id', Integer, ForeignKey('tag.id'), primary_key=True)
+    Column('tag_id', Integer, ForeignKey('tag.id'), primary_key=True),
+    Index('ix_task_tags_tag', 'tag_id', 'task_id')  # tag -> tasks (the PK only serves task -> tags)
 )
 
 class Tag(db.Model, TimestampMixin):
@@ -38,6 +40,13 @@ class Tag(db.Model, TimestampMixin):
     name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
 
 class Task(db.Model, TimestampMixin):
+    # Match the list order (due_at, priority desc, id) so filtered pages are index range scans.
+    __table_args__ = (
+        Index('ix_task_due_order', 'due_at', db.text('priority DESC'), 'id'),
+        Index('ix_task_status_due_order', 'status', 'due_at', db.text('priority DESC'), 'id'),
+        Index('ix_task_category_due_order', 'category', 'due_at', db.text('priority DESC'), 'id'),
+        Index('ix_task_updated', 'updated_at'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[str] = mapped_column(String(200), nullable=False)
     description: Mapped[str] = mapped_column(Text, nullable=True)
@@ -50,7 +59,16 @@ class Task(db.Model, TimestampMixin):
     notes = relationship('TaskNote', backref='task', cascade='all, delete-orphan')
     links = relationship('TaskLink', backref='task', cascade='all, delete-orphan')
     subtasks = relationship('Subtask', backref='task', cascade='all, delete-orphan')
-    tags = relationship('Tag', secondary=task_tags, lazy='joined', backref='tasks')
+    tags = relationship('Tag', secondary=task_tags, backref='tasks')
+
+class TaskFacet(db.Model):
+    # Materialized list-page counts, kept current by src/facets.py (kind: status | category | tag)
+    __table_args__ = (UniqueConstraint('kind', 'value', name='uq_task_facet'),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)
+    value: Mapped[str] = mapped_column(String(50), nullable=False)
+    total: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    open: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # status != 'done'
 
 class TaskNote(db.Model, TimestampMixin):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -71,14 +89,64 @@ class Subtask(db.Model, TimestampMixin):
     status: Mapped[str] = mapped_column(String(20), default='todo')  # todo, done
 
 class Event(db.Model, TimestampMixin):
+    # Window (overlap) queries: start_at < :end AND end_at >= :start, one range scan per side.
+    __table_args__ = (
+        Index('ix_event_start', 'start_at', 'end_at'),
+        Index('ix_event_end', 'end_at', 'start_at'),
+        Index('ix_event_uid', 'uid', unique=True),
+        Index('ix_event_updated', 'updated_at'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    uid: Mapped[str] = mapped_column(String(255), nullable=True, default=lambda: f"{uuid4()}@pms")  # iCalendar UID
     title: Mapped[str] = mapped_column(String(200), nullable=False)
     start_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     end_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     location: Mapped[str] = mapped_column(String(255), nullable=True)
     description: Mapped[str] = mapped_column(Text, nullable=True)
+    # Recurring series (src/recurrence.py): RRULE subset, skipped occurrence starts (ISO,
+    # comma separated) and the end of the last occurrence (NULL = open-ended) for window queries.
+    rrule: Mapped[str] = mapped_column(String(255), nullable=True)
+    exdates: Mapped[str] = mapped_column(Text, nullable=True)
+    recur_until: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
+
+    overrides = relationship('EventOverride', backref='event', cascade='all, delete-orphan')
+
+class EventOverride(db.Model, TimestampMixin):
+    # One changed occurrence of a series, keyed by its original start (RECURRENCE-ID).
+    # NULL fields fall back to the series.
+    __table_args__ = (UniqueConstraint('event_id', 'recurrence_id', name='uq_event_override'),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    event_id: Mapped[int] = mapped_column(Integer, ForeignKey('event.id'), nullable=False)
+    recurrence_id: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    title: Mapped[str] = mapped_column(String(200), nullable=True)
+    start_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    end_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    location: Mapped[str] = mapped_column(String(255), nullable=True)
+    description: Mapped[str] = mapped_column(Text, nullable=True)
 
-
+class DeliveredReminder(db.Model):
+    # One row per reminder that went out (src/reminders.py); the unique key makes delivery
+    # at-most-once across restarts and processes. `due_at` is the task due / occurrence start.
+    __table_args__ = (UniqueConstraint('kind', 'ref', 'due_at', name='uq_delivered_reminder'),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)  # task | event
+    ref: Mapped[str] = mapped_column(String(100), nullable=False)  # task id, event id or "<id>@<occurrence>"
+    due_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    delivered_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+class WorkerLock(db.Model):
+    # Leader lease for the background worker (src/worker.py): only the owner runs the jobs.
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    owner: Mapped[str] = mapped_column(String(200), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+class Notification(db.Model):
+    # Outbox for the live channel (src/notify.py): written by whichever process produced the
+    # event, read in id order by every web process. Pruned after a day.
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)  # reminder | mail
+    payload: Mapped[str] = mapped_column(Text, nullable=False)     # JSON
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
 
 class GmailAccount(db.Model, TimestampMixin):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -90,6 +158,49 @@ class OutlookAccount(db.Model, TimestampMixin):
     email: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
     token_path: Mapped[str] = mapped_column(Text, nullable=False)
 
+# Local mail index (kept current by the sync job, read by the inbox)
+class MailMessage(db.Model, TimestampMixin):
+    __table_args__ = (
+        UniqueConstraint('provider', 'account', 'message_id', name='uq_mail_message'),
+        Index('ix_mail_message_thread', 'provider', 'account', 'thread_id'),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    provider: Mapped[str] = mapped_column(String(20), nullable=False)  # gmail | outlook
+    account: Mapped[str] = mapped_column(String(255), nullable=False)
+    message_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    thread_id: Mapped[str] = mapped_column(String(255), nullable=True)
+    open_url: Mapped[str] = mapped_column(Text, nullable=True)
+    sender: Mapped[str] = mapped_column(String(512), nullable=True)
+    subject: Mapped[str] = mapped_column(Text, nullable=True)
+    snippet: Mapped[str] = mapped_column(Text, nullable=True)
+    date: Mapped[str] = mapped_column(String(100), nullable=True)  # raw provider date, for display
+    received_at: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)  # UTC
+
+# Conversation index: one row per thread (Gmail threadId / Outlook conversationId),
+# maintained incrementally by the sync for the threads it touches.
+class MailConversation(db.Model, TimestampMixin):
+    __table_args__ = (UniqueConstraint('provider', 'account', 'thread_key', name='uq_mail_conversation'),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    provider: Mapped[str] = mapped_column(String(20), nullable=False)
+    account: Mapped[str] = mapped_column(String(255), nullable=False)
+    thread_key: Mapped[str] = mapped_column(String(255), nullable=False)  # thread id, or message id if none
+    subject: Mapped[str] = mapped_column(Text, nullable=True)
+    snippet: Mapped[str] = mapped_column(Text, nullable=True)
+    open_url: Mapped[str] = mapped_column(Text, nullable=True)
+    participants: Mapped[str] = mapped_column(Text, nullable=True)  # newest first, comma separated
+    message_count: Mapped[int] = mapped_column(Integer, default=0)
+    latest_message_id: Mapped[int] = mapped_column(Integer, nullable=True)  # MailMessage.id
+    latest_at: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)  # UTC
+
+class MailSyncState(db.Model, TimestampMixin):
+    __table_args__ = (UniqueConstraint('provider', 'account', name='uq_mail_sync_state'),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    provider: Mapped[str] = mapped_column(String(20), nullable=False)
+    account: Mapped[str] = mapped_column(String(255), nullable=False)
+    last_synced_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)  # UTC
+    cursor: Mapped[str] = mapped_column(Text, nullable=True)  # Gmail historyId / Graph deltaLink
+    last_error: Mapped[str] = mapped_column(Text, nullable=True)
+
 class Bookmark(db.Model, TimestampMixin):
     __tablename__ = "bookmark"  # optional, but keeps things explicit
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -100,4 +211,26 @@ class Bookmark(db.Model, TimestampMixin):
     category = db.Column(db.String(20), default='other', nullable=False)
 
     # NEW:
-    #category: Mapped[str] = mapped_column(String(20), default="other", nullable=False)
\ No newline at end of file
+    #category: Mapped[str] = mapped_column(String(20), default="other", nullable=False)
+
+# Task loading profiles -- use one per view so it issues a fixed number of queries and any
+# relationship the view did not ask for raises instead of silently lazy-loading per row.
+TASK_LIST_LOAD = (selectinload(Task.tags), raiseload('*'))  # rows showing tags: +1 query
+TASK_DETAIL_LOAD = (selectinload(Task.tags), selectinload(Task.notes), selectinload(Task.links),
+                    selectinload(Task.subtasks), raiseload('*'))  # one task + its collections: +4
+TASK_SCAN_LOAD = (raiseload('*'),)  # scalar columns only (dashboard, scheduler scans)
+
+# Task.updated_at is the task's version (API ETags): also bump it when only its tags or its
+# notes/links/subtasks changed, which onupdate alone does not see. One UPDATE per flush.
+@event.listens_for(Session, 'after_flush')
+def _touch_tasks(session, flush_context):
+    ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (TaskNote, TaskLink, Subtask)) and obj.task_id:
+            ids.add(obj.task_id)
+        elif isinstance(obj, Task) and obj in session.dirty and db.inspect(obj).attrs.tags.history.has_changes():
+            ids.add(obj.id)
+    ids -= {o.id for o in session.deleted if isinstance(o, Task)}
+    if ids:
+        session.connection().execute(update(Task.__table__).where(Task.__table__.c.id.in_(ids))
+                                     .values(updated_at=datetime.utcnow()))
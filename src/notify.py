@@ -0,0 +1,103 @@
+import json
+import queue
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, func
+from .extensions import db
+from .models import Notification
+
+# Live notifications (reminder firings, new mail) for open browser tabs, sent as
+# server-sent events. Producers -- mostly the worker process -- add a row to the
+# notification table in their own transaction. Each web process runs a single poller
+# thread that reads new rows by id and fans them out to per-connection queues, so an idle
+# tab costs one blocked thread and a queue, never a query of its own. A reconnecting tab
+# sends Last-Event-ID and is caught up from the table.
+
+KEEP = timedelta(days=1)
+REPLAY_LIMIT = 50
+
+Note = namedtuple('Note', 'id kind data')  # data: the JSON payload, as text
+
+def publish(kind, **data):
+    """Add a notification to the current session; it goes out once the session commits."""
+    db.session.add(Notification(kind=kind, payload=json.dumps(data, default=str)))
+
+def prune(now=None):
+    now = now or datetime.utcnow()
+    db.session.execute(delete(Notification).where(Notification.created_at < now - KEEP))
+    db.session.commit()
+
+def since(last_id, limit=REPLAY_LIMIT):
+    """Notifications after `last_id` (oldest first), for a reconnecting client."""
+    rows = db.session.execute(
+        select(Notification.id, Notification.kind, Notification.payload)
+        .where(Notification.id > last_id).order_by(Notification.id.desc()).limit(limit)).all()
+    return [Note(*r) for r in reversed(rows)]
+
+class Broker:
+    def __init__(self, poll=1.0, backlog=100):
+        self.poll = poll        # seconds between reads of the table
+        self.backlog = backlog  # per-connection queue size; a stalled client loses notes, never blocks others
+        self._subs = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_id = None
+
+    def subscribe(self, app):
+        q = queue.Queue(self.backlog)
+        with self._lock:
+            self._subs.add(q)
+            if self._thread is None:
+                # the poller only runs while someone is listening
+                self._thread = threading.Thread(target=self._run, args=(app,), name='notify', daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subs.discard(q)
+
+    @property
+    def listeners(self):
+        return len(self._subs)
+
+    def _run(self, app):
+        with app.app_context():
+            self._last_id = None
+            while True:
+                with self._lock:
+                    if not self._subs:
+                        self._thread = None
+                        return
+                    subs = list(self._subs)
+                try:
+                    notes = self._fetch()
+                except Exception as ex:
+                    print("[Notify] poll failed:", ex)
+                    db.session.rollback()
+                    notes = []
+                finally:
+                    db.session.remove()
+                for n in notes:
+                    for q in subs:
+                        try:
+                            q.put_nowait(n)
+                        except queue.Full:
+                            pass
+                time.sleep(self.poll)
+
+    def _fetch(self):
+        if self._last_id is None:
+            # start from now: anything older is only sent on replay
+            self._last_id = db.session.execute(select(func.coalesce(func.max(Notification.id), 0))).scalar()
+            return []
+        rows = db.session.execute(
+            select(Notification.id, Notification.kind, Notification.payload)
+            .where(Notification.id > self._last_id).order_by(Notification.id).limit(500)).all()
+        if rows:
+            self._last_id = rows[-1].id
+        return [Note(*r) for r in rows]
+
+broker = Broker()
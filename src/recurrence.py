@@ -0,0 +1,363 @@
+import calendar
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, or_, event, update
+from .models import Event, EventOverride
+
+# Recurring events. A series is one Event row with an RRULE (the subset below), skipped
+# starts in `exdates` and changed occurrences in EventOverride. Occurrences are never
+# stored: they are expanded for the window being looked at, widened to whole days, and the
+# expansions are kept in a small LRU keyed by (event id, updated_at, day window), which
+# edits also invalidate. Windows built from now() thus share an entry for the whole day.
+#
+# Supported: FREQ=DAILY|WEEKLY|MONTHLY|YEARLY, INTERVAL, COUNT, UNTIL, BYDAY (WEEKLY: MO..SU;
+# MONTHLY: with an optional ordinal such as 2TU or -1FR), BYMONTHDAY, BYMONTH.
+
+FREQS = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+OCCURRENCE_CACHE_SIZE = 512
+MAX_COUNT = 5000
+DEFAULT_SPAN = timedelta(days=366)  # how far a window with a missing bound reaches
+
+class Occurrence:
+    """One concrete event instance; plain events are occurrences of themselves."""
+    __slots__ = ('event_id', 'title', 'start_at', 'end_at', 'location', 'description', 'recurrence_id')
+
+    def __init__(self, event_id, title, start_at, end_at, location, description, recurrence_id=None):
+        self.event_id = event_id
+        self.title = title
+        self.start_at = start_at
+        self.end_at = end_at
+        self.location = location
+        self.description = description
+        self.recurrence_id = recurrence_id  # original start, for occurrences of a series
+
+    @classmethod
+    def from_event(cls, e):
+        return cls(e.id, e.title, e.start_at, e.end_at, e.location, e.description)
+
+# --- RRULE -----------------------------------------------------------------------------
+
+def _parse_until(value):
+    if value.endswith('Z'):
+        dt = datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+        return dt.astimezone().replace(tzinfo=None)
+    if 'T' in value:
+        return datetime.strptime(value, '%Y%m%dT%H%M%S')
+    return datetime.strptime(value, '%Y%m%d').replace(hour=23, minute=59, second=59)
+
+def _parse_byday(value):
+    out = []
+    for item in value.split(','):
+        item = item.strip().upper()
+        day, n = item[-2:], item[:-2]
+        if day not in WEEKDAYS:
+            raise ValueError(f'Bad BYDAY value: {item}')
+        out.append((int(n) if n not in ('', '+') else None, WEEKDAYS.index(day)))
+    return out
+
+def parse_rrule(text: str) -> dict:
+    """'FREQ=WEEKLY;BYDAY=MO,WE' -> {'freq', 'interval', 'count', 'until', 'byday', ...}; ValueError if unsupported."""
+    rule = {'freq': None, 'interval': 1, 'count': None, 'until': None,
+            'byday': None, 'bymonthday': None, 'bymonth': None}
+    for part in (text or '').strip().removeprefix('RRULE:').split(';'):
+        if not part.strip():
+            continue
+        key, _, value = part.partition('=')
+        key, value = key.strip().upper(), value.strip()
+        if key == 'FREQ':
+            if value.upper() not in FREQS:
+                raise ValueError(f'Unsupported FREQ: {value}')
+            rule['freq'] = value.upper()
+        elif key == 'INTERVAL':
+            rule['interval'] = int(value)
+        elif key == 'COUNT':
+            rule['count'] = int(value)
+        elif key == 'UNTIL':
+            rule['until'] = _parse_until(value)
+        elif key == 'BYDAY':
+            rule['byday'] = _parse_byday(value)
+        elif key == 'BYMONTHDAY':
+            rule['bymonthday'] = [int(v) for v in value.split(',')]
+        elif key == 'BYMONTH':
+            rule['bymonth'] = [int(v) for v in value.split(',')]
+        elif key != 'WKST':
+            raise ValueError(f'Unsupported RRULE part: {key}')
+    if not rule['freq']:
+        raise ValueError('RRULE needs FREQ')
+    if rule['interval'] < 1 or (rule['count'] is not None and not 0 < rule['count'] <= MAX_COUNT):
+        raise ValueError('Bad INTERVAL or COUNT')
+    if rule['byday'] and any(n for n, _ in rule['byday']) and rule['freq'] != 'MONTHLY':
+        raise ValueError('BYDAY ordinals are only supported with FREQ=MONTHLY')
+    if any(not 1 <= abs(d) <= 31 for d in rule['bymonthday'] or ()) or \
+            any(not 1 <= m <= 12 for m in rule['bymonth'] or ()):
+        raise ValueError('Bad BYMONTHDAY or BYMONTH')
+    return rule
+
+def build_rrule(freq, interval=1, byday=(), until=None, count=None) -> str | None:
+    """Form fields -> RRULE text (None when not repeating)."""
+    if not freq:
+        return None
+    parts = [f'FREQ={freq}']
+    if interval and int(interval) > 1:
+        parts.append(f'INTERVAL={int(interval)}')
+    if byday:
+        parts.append('BYDAY=' + ','.join(byday))
+    if count:
+        parts.append(f'COUNT={int(count)}')
+    elif until:
+        parts.append(f"UNTIL={until.strftime('%Y%m%dT%H%M%S')}")
+    text = ';'.join(parts)
+    parse_rrule(text)
+    return text
+
+def _month_days(year, month, rule, dtstart):
+    last = calendar.monthrange(year, month)[1]
+    if rule['bymonthday']:
+        days = {d if d > 0 else last + d + 1 for d in rule['bymonthday']}
+    elif rule['byday'] and rule['freq'] == 'MONTHLY':
+        days = set()
+        for n, wd in rule['byday']:
+            matches = [d for d in range(1, last + 1) if calendar.weekday(year, month, d) == wd]
+            if n is None:
+                days.update(matches)
+            elif -len(matches) <= n <= len(matches) and n != 0:
+                days.add(matches[n - 1] if n > 0 else matches[n])
+    else:
+        days = {dtstart.day}
+    return sorted(d for d in days if 1 <= d <= last)
+
+def _periods(dtstart, rule, skip):
+    """(period start, sorted candidate starts) from the period `skip` periods after dtstart's."""
+    freq, step = rule['freq'], rule['interval']
+    tod = dtstart - datetime.combine(dtstart.date(), datetime.min.time())
+    k = skip
+    while True:
+        if freq == 'DAILY':
+            day = dtstart.date() + timedelta(days=k * step)
+            begin = datetime.combine(day, datetime.min.time())
+            cands = [begin + tod]
+        elif freq == 'WEEKLY':
+            monday = dtstart.date() - timedelta(days=dtstart.weekday()) + timedelta(weeks=k * step)
+            begin = datetime.combine(monday, datetime.min.time())
+            wds = sorted({wd for _, wd in rule['byday']}) if rule['byday'] else [dtstart.weekday()]
+            cands = [begin + timedelta(days=wd) + tod for wd in wds]
+        elif freq == 'MONTHLY':
+            idx = dtstart.year * 12 + dtstart.month - 1 + k * step
+            year, month = divmod(idx, 12)
+            month += 1
+            begin = datetime(year, month, 1)
+            cands = [datetime(year, month, d) + tod for d in _month_days(year, month, rule, dtstart)]
+        else:
+            year = dtstart.year + k * step
+            begin = datetime(year, 1, 1)
+            cands = []
+            for month in rule['bymonth'] or [dtstart.month]:
+                cands += [datetime(year, month, d) + tod for d in _month_days(year, month, rule, dtstart)]
+        if rule['byday'] and freq == 'DAILY':
+            cands = [c for c in cands if c.weekday() in {wd for _, wd in rule['byday']}]
+        if rule['bymonth'] and freq != 'YEARLY':
+            cands = [c for c in cands if c.month in rule['bymonth']]
+        yield begin, sorted(cands)
+        k += 1
+
+def _skip_periods(dtstart, rule, not_before):
+    """Whole periods that end before `not_before` (only safe to skip without COUNT)."""
+    if rule['count'] or not_before is None or not_before <= dtstart:
+        return 0
+    gap = not_before - dtstart
+    freq, step = rule['freq'], rule['interval']
+    if freq == 'DAILY':
+        n = gap.days
+    elif freq == 'WEEKLY':
+        n = gap.days // 7
+    elif freq == 'MONTHLY':
+        n = (not_before.year - dtstart.year) * 12 + not_before.month - dtstart.month
+    else:
+        n = not_before.year - dtstart.year
+    return max(0, n // step - 1)
+
+def iter_starts(dtstart, rule, not_before=None, before=None):
+    """Occurrence starts of the series in order, from `not_before` until `before` (exclusive)."""
+    count = 0
+    for begin, cands in _periods(dtstart, rule, _skip_periods(dtstart, rule, not_before)):
+        if before is not None and begin >= before:
+            return
+        if rule['until'] is not None and begin > rule['until']:
+            return
+        for start in cands:
+            if start < dtstart:
+                continue
+            if rule['until'] is not None and start > rule['until']:
+                return
+            count += 1
+            if rule['count'] is not None and count > rule['count']:
+                return
+            if before is not None and start >= before:
+                return
+            if not_before is None or start >= not_before:
+                yield start
+
+def parse_exdates(text):
+    out = set()
+    for v in (text or '').split(','):
+        v = v.strip()
+        if v:
+            try:
+                out.add(datetime.fromisoformat(v))
+            except ValueError:
+                pass
+    return out
+
+def format_exdates(dates):
+    return ','.join(d.isoformat() for d in sorted(dates)) or None
+
+def series_end(e):
+    """End of the last occurrence of series `e` (for Event.recur_until); None if open-ended."""
+    if not e.rrule or not e.start_at:
+        return None
+    rule = parse_rrule(e.rrule)
+    if rule['count'] is None and rule['until'] is None:
+        return None
+    last = None
+    for last in iter_starts(e.start_at, rule):
+        pass
+    if last is None:
+        return e.start_at
+    return last + ((e.end_at - e.start_at) if e.end_at else timedelta(0))
+
+# --- expansion + cache -----------------------------------------------------------------
+
+_cache = OrderedDict()  # (event id, updated_at, day start, day end) -> tuple of Occurrence
+_lock = threading.Lock()
+
+def invalidate_occurrences(event_id=None):
+    with _lock:
+        if event_id is None:
+            _cache.clear()
+        else:
+            for key in [k for k in _cache if k[0] == event_id]:
+                del _cache[key]
+
+def default_window(start, end, now=None):
+    """Fill a missing window bound: DEFAULT_SPAN before `end` / after `start` (or around now)."""
+    now = now or datetime.now()
+    if start is None:
+        start = (end or now) - DEFAULT_SPAN
+    if end is None:
+        end = max(start, now) + DEFAULT_SPAN
+    return start, end
+
+def _day_window(start, end):
+    """[start, end) widened to midnights, so nearby windows share a cache entry."""
+    floor = datetime.combine(start.date(), datetime.min.time())
+    ceil = datetime.combine(end.date(), datetime.min.time())
+    if ceil < end:
+        ceil += timedelta(days=1)
+    return floor, ceil
+
+def _expand(e, start, end, overrides):
+    rule = parse_rrule(e.rrule)
+    if end is None and rule['until'] is None and rule['count'] is None:
+        raise ValueError('an open-ended series needs a window end')
+    duration = (e.end_at - e.start_at) if e.end_at else None
+    skipped = parse_exdates(e.exdates)
+    changed = {o.recurrence_id: o for o in overrides}
+    span = duration or timedelta(0)
+
+    def overlaps(s, en):
+        return (end is None or s < end) and (start is None or (en or s) >= start)
+
+    out = []
+    for rid in iter_starts(e.start_at, rule, start - span if start else None, end):
+        if rid in skipped or rid in changed:
+            continue
+        o_end = rid + duration if duration is not None else None
+        if overlaps(rid, o_end):
+            out.append(Occurrence(e.id, e.title, rid, o_end, e.location, e.description, rid))
+    for rid, ov in changed.items():
+        if rid in skipped:
+            continue
+        o_start = ov.start_at or rid
+        o_end = ov.end_at or (o_start + duration if duration is not None else None)
+        if overlaps(o_start, o_end):
+            out.append(Occurrence(e.id, ov.title or e.title, o_start, o_end, ov.location or e.location,
+                                  ov.description or e.description, rid))
+    out.sort(key=lambda o: o.start_at)
+    return tuple(out)
+
+def events_in_window(start, end):
+    """Plain (non-recurring) events overlapping [start, end); no end_at means a point at start_at."""
+    query = Event.query.filter(Event.start_at.isnot(None), Event.rrule.is_(None))
+    if end:
+        query = query.filter(Event.start_at < end)
+    if start:
+        query = query.filter(or_(Event.end_at >= start, and_(Event.end_at.is_(None), Event.start_at >= start)))
+    return query.order_by(Event.start_at.asc())
+
+def series_in_window(start, end):
+    query = Event.query.filter(Event.rrule.isnot(None), Event.start_at.isnot(None))
+    if end:
+        query = query.filter(Event.start_at < end)
+    if start:
+        query = query.filter(or_(Event.recur_until.is_(None), Event.recur_until >= start))
+    return query
+
+def expand_series(series, start, end):
+    """Occurrences of the given series rows in [start, end), from the cache where possible."""
+    start, end = default_window(start, end)
+    lo, hi = _day_window(start, end)
+    cached, misses = [], []
+    with _lock:
+        for e in series:
+            key = (e.id, e.updated_at, lo, hi)
+            hit = _cache.get(key)
+            if hit is None:
+                misses.append(e)
+            else:
+                _cache.move_to_end(key)
+                cached.extend(hit)
+    if misses:
+        overrides = {}
+        for ov in EventOverride.query.filter(EventOverride.event_id.in_([e.id for e in misses])):
+            overrides.setdefault(ov.event_id, []).append(ov)
+        for e in misses:
+            try:
+                occ = _expand(e, lo, hi, overrides.get(e.id, ()))
+            except (ValueError, OverflowError) as ex:
+                print(f"[Calendar] Skipping event {e.id} with bad RRULE {e.rrule!r}: {ex}")
+                occ = ()
+            with _lock:
+                _cache[(e.id, e.updated_at, lo, hi)] = occ
+                while len(_cache) > OCCURRENCE_CACHE_SIZE:
+                    _cache.popitem(last=False)
+            cached.extend(occ)
+    # cut the day window down to the one asked for (same overlap rule as _expand)
+    return [o for o in cached if o.start_at < end and (o.end_at or o.start_at) >= start]
+
+def occurrences_between(start, end):
+    """Every event occurrence overlapping [start, end), plain events and series, by start.
+
+    A missing bound is clamped to DEFAULT_SPAN (series have no natural end).
+    """
+    start, end = default_window(start, end)
+    out = [Occurrence.from_event(e) for e in events_in_window(start, end)]
+    out += expand_series(series_in_window(start, end).all(), start, end)
+    out.sort(key=lambda o: o.start_at)
+    return out
+
+# Edits to a series or its overrides drop its cached windows; override changes also bump
+# the series' updated_at, which is part of the cache key (so other processes notice too).
+@event.listens_for(Event, 'after_update')
+@event.listens_for(Event, 'after_delete')
+def _event_changed(mapper, connection, target):
+    invalidate_occurrences(target.id)
+
+@event.listens_for(EventOverride, 'after_insert')
+@event.listens_for(EventOverride, 'after_update')
+@event.listens_for(EventOverride, 'after_delete')
+def _override_changed(mapper, connection, target):
+    connection.execute(update(Event.__table__).where(Event.__table__.c.id == target.event_id)
+                       .values(updated_at=datetime.utcnow()))
+    invalidate_occurrences(target.event_id)
@@ -0,0 +1,269 @@
+import heapq
+import itertools
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import event, select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .extensions import db
+from .models import Task, Event, EventOverride, DeliveredReminder
+from .recurrence import expand_series
+from .notify import publish
+
+# Reminder engine: instead of rescanning every minute, keep a min-heap of the fire times
+# (due / start minus the lead time) inside a rolling horizon, loaded with indexed range
+# queries, and sleep until the earliest one. Changes reach the heap from this process's
+# commits (SQLAlchemy events) and, for other processes and bulk statements, from a cheap
+# updated_at > watermark poll. Every reminder is re-checked against its row right before
+# it fires and recorded in delivered_reminder, so stale heap entries never fire and
+# nothing fires twice.
+
+Reminder = namedtuple('Reminder', 'kind ref item_id at title')  # at: task due_at / occurrence start
+
+SKEW = timedelta(minutes=2)  # updated_at is stamped at flush, the commit can land later
+_CHUNK = 500                 # ids per IN list
+
+class ReminderEngine:
+    def __init__(self, lead=timedelta(minutes=5), horizon=timedelta(hours=6),
+                 grace=timedelta(minutes=15), poll=timedelta(seconds=30), keep=timedelta(days=30)):
+        self.lead = lead        # how long before due/start a reminder fires
+        self.horizon = horizon  # how far ahead the heap is loaded
+        self.grace = grace      # missed reminders younger than this still fire after a restart
+        self.poll = poll        # how often rows changed by other processes are picked up
+        self.keep = keep        # delivered_reminder retention
+        self.handlers = []      # callables(Reminder) run on delivery, besides the log line
+        self._heap = []         # (fire_at, seq, generation, Reminder)
+        self._gen = {}          # (kind, item_id) -> generation; bumped when an item is re-read
+        self._seq = itertools.count()
+        self._pending = set()   # (kind, item_id) changed since the last pass
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stop = False
+        self._loaded_until = None
+        self._next_poll = None
+        self._watermark = None
+        self._seen = {}         # (kind, id) -> updated_at already picked up inside the SKEW lookback
+
+    # --- lifecycle ---
+
+    def start(self, app):
+        if self.running:
+            return
+        cfg = app.config
+        self.lead = timedelta(minutes=int(cfg.get('REMINDER_LEAD_MINUTES', 5)))
+        self.poll = timedelta(seconds=int(cfg.get('REMINDER_POLL_SECONDS', 30)))
+        self._stop = False
+        self._loaded_until = self._next_poll = self._watermark = None  # start from a fresh load
+        self._seen = {}
+        self._thread = threading.Thread(target=self._run, args=(app,), name='reminders', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def notify_changed(self, keys):
+        if not keys or not self.running:
+            return
+        with self._cond:
+            self._pending.update(keys)
+            self._cond.notify()
+
+    def _run(self, app):
+        with app.app_context():
+            while not self._stop:
+                try:
+                    self.tick()
+                except Exception as ex:
+                    import traceback
+                    print("[Reminders] tick failed:", ex)
+                    traceback.print_exc()
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+                with self._cond:
+                    if self._stop or self._pending:
+                        continue
+                    self._cond.wait(self.seconds_until_next())
+
+    def seconds_until_next(self, now=None):
+        now = now or datetime.now()
+        wake = [self._loaded_until, self._next_poll]
+        if self._heap:
+            wake.append(self._heap[0][0])
+        wake = [w for w in wake if w is not None]
+        return max(0.0, (min(wake) - now).total_seconds()) if wake else 1.0
+
+    # --- one pass: reload / apply changes / fire what is due ---
+
+    def tick(self, now=None):
+        now = now or datetime.now()
+        if self._loaded_until is None or now >= self._loaded_until:
+            self.reload(now)
+        if self._next_poll is None or now >= self._next_poll:
+            self._poll_changes()
+            self._next_poll = now + self.poll
+        with self._cond:
+            pending, self._pending = self._pending, set()
+        if pending:
+            self._refresh(pending, now)
+        fired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, gen, r = heapq.heappop(self._heap)
+            if gen != self._gen.get((r.kind, r.item_id)):
+                continue  # superseded by a newer read of the item
+            if self._deliver(r, now):
+                fired.append(r)
+        return fired
+
+    def reload(self, now):
+        self._heap, self._gen = [], {}
+        lo, hi = now - self.grace, now + self.horizon + self.lead
+        for r in self._task_reminders(lo, hi, Task.query):
+            self._push(r)
+        for r in self._event_reminders(lo, hi, None):
+            self._push(r)
+        self._loaded_until = now + self.horizon
+        if self._watermark is None:
+            self._watermark = datetime.utcnow()
+        db.session.execute(delete(DeliveredReminder).where(DeliveredReminder.due_at < now - self.keep))
+        db.session.commit()
+
+    def _refresh(self, keys, now):
+        lo, hi = now - self.grace, self._loaded_until + self.lead
+        task_ids = [i for k, i in keys if k == 'task']
+        event_ids = [i for k, i in keys if k == 'event']
+        for key in keys:
+            self._gen[key] = self._gen.get(key, 0) + 1  # drop whatever the heap holds for them
+        for i in range(0, len(task_ids), _CHUNK):
+            for r in self._task_reminders(lo, hi, Task.query.filter(Task.id.in_(task_ids[i:i + _CHUNK]))):
+                self._push(r)
+        for i in range(0, len(event_ids), _CHUNK):
+            for r in self._event_reminders(lo, hi, event_ids[i:i + _CHUNK]):
+                self._push(r)
+
+    def _poll_changes(self):
+        if self._watermark is None:
+            return
+        # look back SKEW for late commits; rows already picked up at the same updated_at
+        # are skipped, so a quiet poll pends nothing
+        mark = self._watermark - SKEW
+        keys = set()
+        for kind, model in (('task', Task), ('event', Event)):
+            rows = db.session.execute(select(model.id, model.updated_at).where(model.updated_at > mark)).all()
+            for r in rows:
+                key = (kind, r.id)
+                if self._seen.get(key) != r.updated_at:
+                    self._seen[key] = r.updated_at
+                    keys.add(key)
+                self._watermark = max(self._watermark, r.updated_at)
+        mark = self._watermark - SKEW
+        self._seen = {k: at for k, at in self._seen.items() if at > mark}
+        if keys:
+            with self._cond:
+                self._pending.update(keys)
+
+    # --- sources ---
+
+    def _task_reminders(self, lo, hi, query):
+        rows = (query.with_entities(Task.id, Task.title, Task.due_at)
+                .filter(Task.status != 'done', Task.due_at >= lo, Task.due_at < hi))
+        return [Reminder('task', str(r.id), r.id, r.due_at, r.title) for r in rows]
+
+    def _event_reminders(self, lo, hi, ids):
+        plain = Event.query.filter(Event.rrule.is_(None), Event.start_at >= lo, Event.start_at < hi)
+        series = Event.query.filter(Event.rrule.isnot(None), Event.start_at < hi,
+                                    (Event.recur_until.is_(None)) | (Event.recur_until >= lo))
+        if ids is not None:
+            plain = plain.filter(Event.id.in_(ids))
+            series = series.filter(Event.id.in_(ids))
+        out = [Reminder('event', str(e.id), e.id, e.start_at, e.title) for e in plain]
+        for o in expand_series(series.all(), lo, hi):
+            if lo <= o.start_at < hi:
+                out.append(Reminder('event', f"{o.event_id}@{o.recurrence_id.isoformat()}", o.event_id,
+                                    o.start_at, o.title))
+        return out
+
+    def _push(self, r):
+        gen = self._gen.setdefault((r.kind, r.item_id), 0)
+        heapq.heappush(self._heap, (r.at - self.lead, next(self._seq), gen, r))
+
+    # --- delivery ---
+
+    def _still_valid(self, r):
+        if r.kind == 'task':
+            row = db.session.execute(select(Task.status, Task.due_at).where(Task.id == r.item_id)).first()
+            return row is not None and row.status != 'done' and row.due_at == r.at
+        e = db.session.get(Event, r.item_id)
+        if e is None:
+            return False
+        if not e.rrule:
+            return e.start_at == r.at
+        return any(o.start_at == r.at for o in expand_series([e], r.at, r.at + timedelta(seconds=1)))
+
+    def _deliver(self, r, now):
+        if not self._still_valid(r):
+            return False
+        try:
+            with db.session.begin_nested():
+                db.session.add(DeliveredReminder(kind=r.kind, ref=r.ref, due_at=r.at))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return False  # already delivered (earlier run or another process)
+        if r.kind == 'task':
+            print(f"[REMINDER] Task due soon: {r.title} @ {r.at}")
+        else:
+            print(f"[REMINDER] Event starting soon: {r.title} @ {r.at}")
+        for handler in self.handlers:
+            try:
+                handler(r)
+            except Exception as ex:
+                print("[Reminders] handler failed:", ex)
+                db.session.rollback()
+        return True
+
+engine = ReminderEngine()
+
+# In-process changes: note which tasks/events a flush touched, hand them over on commit.
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    keys = session.info.setdefault('reminder_keys', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Task):
+            keys.add(('task', obj.id))
+        elif isinstance(obj, Event):
+            keys.add(('event', obj.id))
+        elif isinstance(obj, EventOverride):
+            keys.add(('event', obj.event_id))
+
+@event.listens_for(Session, 'after_commit')
+def _publish_changes(session):
+    keys = session.info.pop('reminder_keys', None)
+    if keys:
+        engine.notify_changed(keys)
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_changes(session):
+    session.info.pop('reminder_keys', None)
+
+def _notify(r):
+    # push to open browser tabs (src/notify.py)
+    what = 'Task due soon' if r.kind == 'task' else 'Event starting soon'
+    publish('reminder', text=f"{what}: {r.title} ({r.at:%H:%M})", level='warning', item=r.kind, ref=r.ref)
+    db.session.commit()
+
+engine.handlers.append(_notify)
+
+def start_reminders(app):
+    engine.start(app)
+    return engine
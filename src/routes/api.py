@@ -0,0 +1,146 @@
+import hashlib
+from datetime import datetime
+from flask import Blueprint, request, jsonify, current_app, url_for
+from flask_login import login_required
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload, raiseload
+from werkzeug.exceptions import HTTPException
+from ..extensions import db
+from ..models import Task, Tag, TaskNote, TaskLink, Subtask, task_tags
+
+# Versioned JSON API for scripts. Every GET answers with a strong ETag derived from
+# Task.updated_at (bumped for tag/note/link/subtask changes too); a matching If-None-Match
+# gets a bare 304 after one narrow (id, updated_at) query -- nothing is loaded or serialized.
+
+api_bp = Blueprint('api', __name__)
+
+TASK_FIELDS = ('id', 'title', 'description', 'status', 'category', 'priority',
+               'start_at', 'due_at', 'created_at', 'updated_at')
+TASK_RELATIONS = ('tags', 'notes', 'links', 'subtasks')
+CHILD_FIELDS = {
+    'notes': (TaskNote, ('id', 'task_id', 'body', 'created_at', 'updated_at')),
+    'links': (TaskLink, ('id', 'task_id', 'title', 'url', 'kind', 'created_at', 'updated_at')),
+    'subtasks': (Subtask, ('id', 'task_id', 'title', 'status', 'created_at', 'updated_at')),
+}
+MAX_LIMIT = 200
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+@api_bp.errorhandler(ApiError)
+def _api_error(e):
+    return jsonify(error=str(e)), e.status
+
+@api_bp.errorhandler(HTTPException)
+def _http_error(e):
+    return jsonify(error=e.description), e.code
+
+def _value(v):
+    return v.isoformat() if isinstance(v, datetime) else v
+
+def _row(obj, fields):
+    return {f: _value(getattr(obj, f)) for f in fields}
+
+def _fields(allowed):
+    """`?fields=a,b` -> requested subset of `allowed` (id always included), default all."""
+    raw = request.args.get('fields')
+    if not raw:
+        return [f for f in allowed if f not in TASK_RELATIONS]
+    wanted = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in wanted if f not in allowed]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}")
+    return ['id'] + [f for f in dict.fromkeys(wanted) if f != 'id']
+
+def _limit():
+    try:
+        limit = int(request.args.get('limit', current_app.config.get('TASKS_PAGE_SIZE', 50)))
+    except ValueError:
+        raise ApiError('limit must be an integer')
+    return max(1, min(limit, MAX_LIMIT))
+
+def _conditional(version, build):
+    """304 if the client already has `version`, else the JSON `build()` returns, tagged."""
+    etag = hashlib.sha1(f"{request.full_path}|{version}".encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        resp = current_app.response_class(status=304)
+    else:
+        resp = jsonify(build())
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+def _task_version(tid):
+    stamp = db.session.execute(select(Task.updated_at).where(Task.id == tid)).scalar_one_or_none()
+    if stamp is None:
+        raise ApiError('Task not found', 404)
+    return stamp.isoformat()
+
+def _task_options(fields):
+    return [selectinload(getattr(Task, r)) for r in TASK_RELATIONS if r in fields] + [raiseload('*')]
+
+def _task_dict(t, fields):
+    out = _row(t, [f for f in fields if f not in TASK_RELATIONS])
+    if 'tags' in fields:
+        out['tags'] = sorted(tag.name for tag in t.tags)
+    for rel in ('notes', 'links', 'subtasks'):
+        if rel in fields:
+            out[rel] = [_row(c, CHILD_FIELDS[rel][1]) for c in sorted(getattr(t, rel), key=lambda c: c.id)]
+    return out
+
+@api_bp.route('/tasks')
+@login_required
+def list_tasks():
+    """Tasks in id order: ?status= &category= &tag= &updated_since= &fields= &limit= &cursor="""
+    fields = _fields(TASK_FIELDS + TASK_RELATIONS)
+    limit = _limit()
+    sel = select(Task.id, Task.updated_at)
+    if request.args.get('status'):
+        sel = sel.where(Task.status == request.args['status'])
+    if request.args.get('category'):
+        sel = sel.where(Task.category == request.args['category'])
+    if request.args.get('tag'):
+        sel = sel.where(Task.id.in_(select(task_tags.c.task_id).join(Tag, Tag.id == task_tags.c.tag_id)
+                                    .where(Tag.name == request.args['tag'].strip().lower())))
+    if request.args.get('updated_since'):
+        try:
+            sel = sel.where(Task.updated_at > datetime.fromisoformat(request.args['updated_since']))
+        except ValueError:
+            raise ApiError('updated_since must be an ISO datetime')
+    if request.args.get('cursor'):
+        try:
+            sel = sel.where(Task.id > int(request.args['cursor']))
+        except ValueError:
+            raise ApiError('Invalid cursor')
+    rows = db.session.execute(sel.order_by(Task.id).limit(limit + 1)).all()
+    next_cursor = str(rows[limit - 1].id) if len(rows) > limit else None
+    rows = rows[:limit]
+
+    def build():
+        ids = [r.id for r in rows]
+        by_id = {t.id: t for t in Task.query.options(*_task_options(fields)).filter(Task.id.in_(ids))} if ids else {}
+        data = [_task_dict(by_id[i], fields) for i in ids if i in by_id]
+        nxt = url_for('api.list_tasks', **{**request.args.to_dict(), 'cursor': next_cursor}) if next_cursor else None
+        return {'data': data, 'next_cursor': next_cursor, 'next': nxt}
+
+    version = ','.join(f"{r.id}@{r.updated_at.isoformat()}" for r in rows) + f"|{next_cursor}"
+    return _conditional(version, build)
+
+@api_bp.route('/tasks/<int:tid>')
+@login_required
+def get_task(tid):
+    fields = _fields(TASK_FIELDS + TASK_RELATIONS)
+    version = _task_version(tid)
+    return _conditional(version, lambda: _task_dict(
+        Task.query.options(*_task_options(fields)).filter_by(id=tid).one(), fields))
+
+@api_bp.route('/tasks/<int:tid>/<any(notes, links, subtasks):rel>')
+@login_required
+def task_children(tid, rel):
+    model, allowed = CHILD_FIELDS[rel]
+    fields = _fields(allowed)
+    version = _task_version(tid)  # bumped whenever one of its children changes
+    return _conditional(version, lambda: {'data': [
+        _row(c, fields) for c in model.query.filter_by(task_id=tid).order_by(model.id)]})
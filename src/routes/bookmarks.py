@@ -3,7 +3,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from ..extensions import db
 from ..models import Bookmark
-from sqlalchemy import or_
+from ..search import ranked
 
 bookmarks_bp = Blueprint('bookmarks', __name__)
 
@@ -87,21 +87,20 @@ def manage():
     cat = (request.args.get("cat") or "all").strip().lower()
 
     query = Bookmark.query
-    if q:
-        like = f"%{q}%"
-        query = query.filter(or_(
-            Bookmark.title.ilike(like),
-            Bookmark.url.ilike(like),
-            Bookmark.notes.ilike(like)
-        ))
     if cat and cat != "all":
         query = query.filter(Bookmark.category == cat)
 
-    items = query.order_by(Bookmark.updated_at.desc()).all()
+    query = query.order_by(Bookmark.updated_at.desc())
+    more = False
+    if q:
+        items, more = ranked(query, Bookmark, "bookmark", q, (Bookmark.title, Bookmark.url, Bookmark.notes))
+    else:
+        items = query.all()
     return render_template(
         "bookmarks/manage.html",
         items=items,
         q=q,
+        more=more,
         cat=cat,
         categories=CATEGORIES
     )
\ No newline at end of file
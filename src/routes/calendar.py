@@ -1,12 +1,60 @@
 
-from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from flask_login import login_required
 from ..extensions import db
-from ..models import Event
+from ..models import Event, EventOverride
+from ..recurrence import (WEEKDAYS, parse_rrule, build_rrule, series_end, parse_exdates, format_exdates,
+                          occurrences_between, invalidate_occurrences, expand_series)
+from ..freebusy import Slot, busy_slots, merge_busy, free_gaps, overlapping_pairs, conflicts_for
+from ..ics import export_ics, import_ics
 
 calendar_bp = Blueprint('calendar', __name__)
 
+def _set_recurrence(e):
+    """Repeat fields of the event form -> e.rrule / e.recur_until; False (and a flash) if invalid."""
+    freq = request.form.get('repeat', '').strip().upper()
+    until = request.form.get('repeat_until', '').strip()
+    try:
+        until_dt = datetime.fromisoformat(until).replace(hour=23, minute=59, second=59) if until else None
+        rrule = build_rrule(freq, request.form.get('repeat_interval') or 1,
+                            [d for d in WEEKDAYS if d in request.form.getlist('repeat_byday')] if freq == 'WEEKLY' else (),
+                            until_dt, request.form.get('repeat_count') or None)
+    except ValueError as ex:
+        flash(f'Invalid repeat rule: {ex}', 'danger')
+        return False
+    if rrule and not e.start_at:
+        flash('A repeating event needs a start', 'danger')
+        return False
+    if rrule != e.rrule:
+        # skipped and changed occurrences belong to the old rule
+        e.exdates = None
+        e.overrides = []
+    e.rrule = rrule
+    e.recur_until = series_end(e)
+    return True
+
+CONFLICT_HORIZON = timedelta(days=90)  # how far ahead a saved series is checked
+
+def _warn_conflicts(e):
+    """Flash a warning if the saved event (or its next occurrences) overlaps anything."""
+    if not e.start_at or not e.end_at or e.end_at <= e.start_at:
+        return
+    if e.rrule:
+        horizon = max(e.start_at, datetime.now()) + CONFLICT_HORIZON
+        mine = [Slot(o.start_at, o.end_at, 'event', e.id, o.title)
+                for o in expand_series([e], e.start_at, horizon) if o.end_at]
+    else:
+        mine = [Slot(e.start_at, e.end_at, 'event', e.id, e.title)]
+    if not mine:
+        return
+    hits = conflicts_for(mine, min(s.start for s in mine), max(s.end for s in mine), exclude_event=e.id)
+    if hits:
+        names = ', '.join(f"{h.title} ({h.start:%Y-%m-%d %H:%M})" for h in hits[:3])
+        more = f' and {len(hits) - 3} more' if len(hits) > 3 else ''
+        flash(f'Overlaps with {names}{more}', 'warning')
+
 @calendar_bp.route('/')
 @login_required
 def list_events():
@@ -29,11 +77,14 @@ def new_event():
         if end_at:
             try: e.end_at = datetime.fromisoformat(end_at)
             except: pass
+        if not _set_recurrence(e):
+            return redirect(url_for('calendar.new_event'))
         db.session.add(e)
         db.session.commit()
         flash('Event created', 'success')
+        _warn_conflicts(e)
         return redirect(url_for('calendar.list_events'))
-    return render_template('calendar/edit.html', event=None)
+    return render_template('calendar/edit.html', event=None, rule=None, weekdays=WEEKDAYS)
 
 @calendar_bp.route('/<int:eid>/edit', methods=['GET','POST'])
 @login_required
@@ -55,10 +106,18 @@ def edit_event(eid):
             except: pass
         else:
             e.end_at = None
+        if not _set_recurrence(e):
+            db.session.rollback()
+            return redirect(url_for('calendar.edit_event', eid=eid))
         db.session.commit()
         flash('Event updated', 'success')
+        _warn_conflicts(e)
         return redirect(url_for('calendar.list_events'))
-    return render_template('calendar/edit.html', event=e)
+    rule = None
+    if e.rrule:
+        try: rule = parse_rrule(e.rrule)
+        except ValueError: pass
+    return render_template('calendar/edit.html', event=e, rule=rule, weekdays=WEEKDAYS)
 
 @calendar_bp.route('/<int:eid>/delete', methods=['POST'])
 @login_required
@@ -74,19 +133,152 @@ def delete_event(eid):
 def full_view():
     return render_template('calendar/full.html')
 
+def _window_bound(value, tz_name):
+    """FullCalendar start/end -> naive local datetime (how Event times are stored)."""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if dt.tzinfo is None and tz_name and tz_name != 'local':
+        try:
+            dt = dt.replace(tzinfo=ZoneInfo(tz_name))
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return dt.astimezone().replace(tzinfo=None) if dt.tzinfo else dt
+
 @calendar_bp.route('/feed.json')
 @login_required
 def feed_events_json():
-    items = Event.query.all()
+    tz_name = request.args.get('timeZone')
+    start = _window_bound(request.args.get('start'), tz_name)
+    end = _window_bound(request.args.get('end'), tz_name)
+    items = occurrences_between(start, end)
     def to_iso(dt):
         return dt.isoformat() if dt else None
     events = []
-    for e in items:
-        events.append({
-            "id": e.id,
-            "title": e.title,
-            "start": to_iso(e.start_at),
-            "end": to_iso(e.end_at),
-            "extendedProps": {"location": e.location or "", "description": e.description or ""}
-        })
-    return jsonify(events)
+    for o in items:
+        item = {
+            "id": o.event_id,
+            "title": o.title,
+            "start": to_iso(o.start_at),
+            "end": to_iso(o.end_at),
+            "extendedProps": {"location": o.location or "", "description": o.description or ""}
+        }
+        if o.recurrence_id:
+            item["id"] = f"{o.event_id}@{o.recurrence_id.isoformat()}"
+            item["groupId"] = o.event_id
+            item["url"] = url_for('calendar.edit_occurrence', eid=o.event_id, rid=o.recurrence_id.isoformat())
+        events.append(item)
+    resp = jsonify(events)
+    # revalidate every time (edits must show at once), but unchanged windows cost a 304
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    resp.add_etag()
+    return resp.make_conditional(request)
+
+def _slot_json(s):
+    return {"kind": s.kind, "id": s.ref, "title": s.title, "start": s.start.isoformat(), "end": s.end.isoformat()}
+
+def _json_window():
+    tz_name = request.args.get('timeZone')
+    start = _window_bound(request.args.get('start'), tz_name)
+    end = _window_bound(request.args.get('end'), tz_name)
+    if not start or not end or end <= start:
+        return None
+    return start, end
+
+@calendar_bp.route('/freebusy.json')
+@login_required
+def freebusy_json():
+    """Busy blocks, free gaps and overlapping pairs in ?start=&end= (ISO), events + task blocks."""
+    window = _json_window()
+    if window is None:
+        return jsonify(error='start and end (ISO, start < end) are required'), 400
+    start, end = window
+    slots = busy_slots(start, end, include_tasks=request.args.get('tasks', '1') != '0')
+    blocks = merge_busy(slots)
+    return jsonify({
+        "start": start.isoformat(), "end": end.isoformat(),
+        "free": not slots,
+        "busy": [{"start": max(b, start).isoformat(), "end": min(en, end).isoformat(),
+                  "items": [_slot_json(x) for x in items]} for b, en, items in blocks],
+        "free_slots": [{"start": a.isoformat(), "end": b.isoformat()} for a, b in free_gaps(blocks, start, end)],
+        "conflicts": [[_slot_json(a), _slot_json(b)] for a, b in overlapping_pairs(slots)],
+    })
+
+@calendar_bp.route('/conflicts.json')
+@login_required
+def conflicts_json():
+    """What overlaps ?start=&end= (e.g. a slot being booked); ?event_id= ignores that event."""
+    window = _json_window()
+    if window is None:
+        return jsonify(error='start and end (ISO, start < end) are required'), 400
+    start, end = window
+    hits = conflicts_for([Slot(start, end, 'candidate', None, '')], start, end,
+                         exclude_event=request.args.get('event_id', type=int),
+                         include_tasks=request.args.get('tasks', '1') != '0')
+    return jsonify({"conflicts": [_slot_json(h) for h in hits]})
+
+@calendar_bp.route('/<int:eid>/occurrence', methods=['GET','POST'])
+@login_required
+def edit_occurrence(eid):
+    """Change, skip or restore one occurrence (?rid=<original start>) of a recurring event."""
+    e = Event.query.get_or_404(eid)
+    try:
+        rid = datetime.fromisoformat(request.values.get('rid', ''))
+    except ValueError:
+        flash('Unknown occurrence', 'warning')
+        return redirect(url_for('calendar.edit_event', eid=eid))
+    ov = EventOverride.query.filter_by(event_id=eid, recurrence_id=rid).first()
+    if request.method == 'POST':
+        action = request.form.get('action', 'save')
+        skipped = parse_exdates(e.exdates)
+        if action in ('skip', 'restore') and ov is not None:
+            db.session.delete(ov)
+        if action == 'skip':
+            skipped.add(rid)
+        elif action == 'restore':
+            skipped.discard(rid)
+        else:
+            if ov is None:
+                ov = EventOverride(event_id=eid, recurrence_id=rid)
+                db.session.add(ov)
+            ov.title = request.form.get('title', '').strip() or None
+            ov.location = request.form.get('location', '').strip() or None
+            ov.description = request.form.get('description', '').strip() or None
+            for field in ('start_at', 'end_at'):
+                value = request.form.get(field, '').strip()
+                try: setattr(ov, field, datetime.fromisoformat(value) if value else None)
+                except ValueError: pass
+        e.exdates = format_exdates(skipped)
+        db.session.commit()
+        invalidate_occurrences(eid)
+        flash({'skip': 'Occurrence skipped', 'restore': 'Occurrence restored'}.get(action, 'Occurrence updated'), 'success')
+        return redirect(url_for('calendar.full_view'))
+    skipped = rid in parse_exdates(e.exdates)
+    return render_template('calendar/occurrence.html', event=e, rid=rid, override=ov, skipped=skipped)
+
+@calendar_bp.route('/export.ics')
+@login_required
+def export_calendar():
+    return Response(stream_with_context(export_ics()), mimetype='text/calendar',
+                    headers={'Content-Disposition': 'attachment; filename="pms-calendar.ics"'})
+
+@calendar_bp.route('/import', methods=['POST'])
+@login_required
+def import_calendar():
+    f = request.files.get('file')
+    if not f or not f.filename:
+        flash('Choose an .ics file to import', 'warning')
+        return redirect(url_for('calendar.list_events'))
+    try:
+        stats = import_ics(f.stream)
+    except Exception as ex:
+        db.session.rollback()
+        print("[Calendar] import failed:", ex)
+        flash(f'Import failed: {ex}', 'danger')
+        return redirect(url_for('calendar.list_events'))
+    flash(f"Imported: {stats['created']} new, {stats['updated']} updated, {stats['overrides']} changed occurrences"
+          + (f", {stats['skipped']} skipped" if stats['skipped'] else ''), 'success')
+    return redirect(url_for('calendar.list_events'))
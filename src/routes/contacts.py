@@ -1,8 +1,10 @@
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required
 from ..extensions import db
 from ..models import Contact
+from ..search import ranked
+from ..suggest import suggest_contacts
 
 contacts_bp = Blueprint('contacts', __name__)
 
@@ -10,12 +12,24 @@ contacts_bp = Blueprint('contacts', __name__)
 @login_required
 def list_contacts():
     q = request.args.get('q', '').strip()
-    query = Contact.query
+    query = Contact.query.order_by(Contact.name.asc())
+    more = False
     if q:
-        like = f"%{q}%"
-        query = query.filter((Contact.name.ilike(like)) | (Contact.email.ilike(like)) | (Contact.phone.ilike(like)))
-    contacts = query.order_by(Contact.name.asc()).all()
-    return render_template('contacts/list.html', contacts=contacts, q=q)
+        contacts, more = ranked(query, Contact, 'contact', q, (Contact.name, Contact.email, Contact.phone))
+    else:
+        contacts = query.all()
+    return render_template('contacts/list.html', contacts=contacts, q=q, more=more)
+
+@contacts_bp.route('/suggest')
+@login_required
+def suggest():
+    """Contacts whose name, any name word, email or phone digits start with `q`."""
+    q = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    hits = suggest_contacts(q, limit) if q else []
+    if request.headers.get('HX-Request'):
+        return render_template('contacts/suggest_options.html', hits=hits)
+    return jsonify(hits)
 
 @contacts_bp.route('/new', methods=['GET','POST'])
 @login_required
@@ -1,14 +1,22 @@
 
+from datetime import datetime, timedelta
 from flask import Blueprint, render_template
 from flask_login import login_required
-from ..models import Task, Note, Event
+from ..models import Task, Note, TASK_SCAN_LOAD
+from ..recurrence import events_in_window, series_in_window, expand_series, Occurrence
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
 @dashboard_bp.route('/')
 @login_required
 def index():
-    open_tasks = Task.query.filter(Task.status != 'done').order_by(Task.due_at.asc().nullslast()).limit(5).all()
+    open_tasks = Task.query.options(*TASK_SCAN_LOAD).filter(Task.status != 'done').order_by(Task.due_at.asc().nullslast()).limit(5).all()
     recent_notes = Note.query.order_by(Note.created_at.desc()).limit(5).all()
-    upcoming_events = Event.query.order_by(Event.start_at.asc().nullslast()).limit(5).all()
+    # next 5 occurrences from now: plain events straight from the index, series expanded only
+    # up to the 5th plain event (or a year ahead)
+    now = datetime.now()
+    upcoming_events = [Occurrence.from_event(e) for e in events_in_window(now, None).limit(5)]
+    horizon = upcoming_events[-1].start_at + timedelta(seconds=1) if len(upcoming_events) == 5 else now + timedelta(days=365)
+    upcoming_events += expand_series(series_in_window(now, horizon).all(), now, horizon)
+    upcoming_events = sorted(upcoming_events, key=lambda o: o.start_at)[:5]
     return render_template('dashboard/index.html', open_tasks=open_tasks, recent_notes=recent_notes, upcoming_events=upcoming_events)
@@ -1,31 +1,19 @@
-import os, json, pathlib, datetime, requests
-from urllib.parse import urlparse, urljoin
+import os, pathlib, datetime
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, session
 from flask_login import login_required
+from sqlalchemy import and_, or_
 from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
-import msal
-from msal import SerializableTokenCache
 from ..extensions import db
-from ..models import GmailAccount, OutlookAccount
+from ..graph_client import graph_client
+from ..mail_search import search_mail
+from ..models import GmailAccount, OutlookAccount, MailMessage, MailSyncState, MailConversation
+from ..mail_sync import (G_SCOPES, O_SCOPES, _g_client_secrets_path, _g_token_path_for,
+    _o_app_config_path, _o_token_path_for, _o_load_app_and_cache, _o_save_cache,
+    sync_all, syncing_accounts, purge_account, invalidate_client, MailRecord, RECORD_COLUMNS)
 
 email_bp = Blueprint('email', __name__)
 
-# --- Gmail ---
-G_SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
-
-def _g_client_secrets_path():
-    return current_app.config.get('GOOGLE_CLIENT_SECRETS')
-
-def _g_token_dir():
-    return pathlib.Path(current_app.config.get('GOOGLE_TOKEN_DIR'))
-
-def _g_token_path_for(email):
-    safe = email.replace('@','_at_').replace('.','_')
-    return _g_token_dir() / f"token_{safe}.json"
-
 def _g_build_flow():
     secrets = _g_client_secrets_path()
     if not os.path.exists(secrets):
@@ -34,159 +22,106 @@ def _g_build_flow():
     flow = Flow.from_client_secrets_file(secrets, scopes=G_SCOPES, redirect_uri=redirect_uri)
     return flow, None
 
-def _g_load_credentials(token_path: pathlib.Path) -> Credentials | None:
-    if not token_path.exists():
-        return None
-    creds = Credentials.from_authorized_user_file(str(token_path), G_SCOPES)
-    if creds and creds.expired and creds.refresh_token:
-        try:
-            creds.refresh(Request())
-            token_path.write_text(creds.to_json())
-        except Exception as ex:
-            print("Credential refresh failed:", ex)
-    return creds
-
-# --- Outlook (Microsoft 365 via Graph) ---
-O_SCOPES = ['openid', 'profile', 'offline_access', 'email', 'Mail.Read']
+# --- Combined Inbox (served from the local index; see mail_sync) ---
+# Keyset pagination over (timestamp, id) descending: each page is one index range scan,
+# however deep the user scrolls. The cursor is "<timestamp iso>~<id>" of the last row shown.
+def _encode_cursor(ts, rid):
+    return f"{ts.isoformat()}~{rid}"
 
-def _o_app_config_path():
-    return current_app.config.get('OUTLOOK_APP_CONFIG')
+def _decode_cursor(cursor):
+    try:
+        ts, rid = cursor.rsplit('~', 1)
+        return datetime.datetime.fromisoformat(ts), int(rid)
+    except (ValueError, AttributeError):
+        return None
 
-def _o_token_dir():
-    return pathlib.Path(current_app.config.get('OUTLOOK_TOKEN_DIR'))
+def _keyset_page(query, ts_col, id_col, cursor, page_size):
+    after = _decode_cursor(cursor) if cursor else None
+    if after:
+        ts, rid = after
+        query = query.filter(or_(ts_col < ts, and_(ts_col == ts, id_col < rid)))
+    return query.order_by(ts_col.desc(), id_col.desc()).limit(page_size + 1).all()
 
-def _o_token_path_for(email):
-    safe = email.replace('@','_at_').replace('.','_')
-    return _o_token_dir() / f"token_{safe}.bin"
+def _since():
+    lookback_days = int(current_app.config.get('EMAIL_LOOKBACK_DAYS', 5))
+    return datetime.datetime.utcnow() - datetime.timedelta(days=lookback_days)
 
-def _o_load_app_and_cache(for_email: str | None = None):
-    cfg_path = _o_app_config_path()
-    if not os.path.exists(cfg_path):
-        return None, None, "Missing Outlook app config. Create: " + cfg_path
-    try:
-        cfg = json.loads(pathlib.Path(cfg_path).read_text())
-        client_id = cfg['client_id']
-        client_secret = cfg['client_secret']
-        tenant = cfg.get('tenant', 'common')
-    except Exception as ex:
-        return None, None, f"Invalid app_config.json: {ex}"
-    authority = f"https://login.microsoftonline.com/{tenant}"
-    cache = SerializableTokenCache()
-    if for_email:
-        tpath = _o_token_path_for(for_email)
-        if tpath.exists():
-            cache.deserialize(tpath.read_text())
-    app = msal.ConfidentialClientApplication(
-        client_id=client_id,
-        client_credential=client_secret,
-        authority=authority,
-        token_cache=cache
-    )
-    return app, cache, None
+def _inbox_page(cursor=None):
+    page_size = int(current_app.config.get('EMAIL_PAGE_SIZE', 50))
+    query = db.session.query(*RECORD_COLUMNS).filter(MailMessage.received_at >= _since())
+    rows = _keyset_page(query, MailMessage.received_at, MailMessage.id, cursor, page_size)
+    rows = [MailRecord.from_row(r) for r in rows]
+    next_cursor = _encode_cursor(rows[page_size - 1].received_at, rows[page_size - 1].id) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
 
-def _o_save_cache(email: str, cache: SerializableTokenCache):
-    if cache.has_state_changed:
-        tpath = _o_token_path_for(email)
-        tpath.parent.mkdir(parents=True, exist_ok=True)
-        tpath.write_text(cache.serialize())
+def _threads_page(cursor=None):
+    page_size = int(current_app.config.get('EMAIL_PAGE_SIZE', 50))
+    query = MailConversation.query.filter(MailConversation.latest_at >= _since())
+    rows = _keyset_page(query, MailConversation.latest_at, MailConversation.id, cursor, page_size)
+    next_cursor = _encode_cursor(rows[page_size - 1].latest_at, rows[page_size - 1].id) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
 
-# --- Combined Inbox ---
 @email_bp.route('/')
 @login_required
 def inbox():
     lookback_days = int(current_app.config.get('EMAIL_LOOKBACK_DAYS', 5))
-
-    # Gmail accounts
     g_accounts = GmailAccount.query.order_by(GmailAccount.email.asc()).all()
-    items = []
-    for acc in g_accounts:
-        token_path = pathlib.Path(acc.token_path)
-        creds = _g_load_credentials(token_path)
-        if not creds:
-            continue
-        try:
-            service = build('gmail', 'v1', credentials=creds, cache_discovery=False)
-            q = f"newer_than:{lookback_days}d -category:spam -in:trash"
-            resp = service.users().messages().list(userId='me', q=q, maxResults=50).execute()
-            msg_ids = [m['id'] for m in resp.get('messages', [])]
-            for mid in msg_ids:
-                m = service.users().messages().get(userId='me', id=mid, format='metadata',
-                    metadataHeaders=['From','Subject','Date']).execute()
-                headers = {h['name']: h['value'] for h in m.get('payload', {}).get('headers', [])}
-                thread_id = m.get('threadId')
-                items.append({
-                    "provider": "gmail",
-                    "account": acc.email,
-                    "id": m['id'],
-                    "threadId": thread_id,
-                    "open_url": f"https://mail.google.com/mail/?authuser={acc.email}#all/{thread_id}",
-                    "snippet": m.get('snippet',''),
-                    "from": headers.get('From',''),
-                    "subject": headers.get('Subject','(no subject)'),
-                    "date": headers.get('Date','')
-                })
-        except Exception as ex:
-            flash(f"Gmail fetch failed for {acc.email}: {ex}", "danger")
-
-    # Outlook accounts
     o_accounts = OutlookAccount.query.order_by(OutlookAccount.email.asc()).all()
-    for acc in o_accounts:
-        app, cache, err = _o_load_app_and_cache(for_email=acc.email)
-        if err:
-            flash(err, "warning")
-            continue
-        try:
-            # try silent token
-            result = None
-            accts = app.get_accounts(username=acc.email)
-            if accts:
-                result = app.acquire_token_silent(scopes=O_SCOPES, account=accts[0])
-            if not result:
-                flash(f"Outlook token expired for {acc.email}. Reconnect.", "warning")
-                continue
+    items, next_cursor = _inbox_page()
+    sync_states = {(st.provider, st.account): st for st in MailSyncState.query.all()}
+    return render_template('email/list.html', g_accounts=g_accounts, o_accounts=o_accounts, items=items,
+                           next_cursor=next_cursor, lookback_days=lookback_days, sync_states=sync_states,
+                           syncing=syncing_accounts())
 
-            access_token = result['access_token']
-            headers = {"Authorization": f"Bearer {access_token}"}
+@email_bp.route('/more')
+@login_required
+def inbox_more():
+    # htmx infinite scroll: next page of rows, ending in another "load more" sentinel
+    items, next_cursor = _inbox_page(request.args.get('cursor'))
+    return render_template('email/rows.html', items=items, next_cursor=next_cursor)
 
-            since = (datetime.datetime.utcnow() - datetime.timedelta(days=lookback_days)).strftime("%Y-%m-%dT%H:%M:%SZ")
-            url = ("https://graph.microsoft.com/v1.0/me/messages"
-                   "?$select=subject,from,receivedDateTime,bodyPreview,webLink"
-                   f"&$filter=receivedDateTime ge {since}"
-                   "&$orderby=receivedDateTime desc&$top=50")
-            resp = requests.get(url, headers=headers, timeout=20)
-            resp.raise_for_status()
-            data = resp.json()
-            for m in data.get('value', []):
-                frm = (m.get('from', {}) or {}).get('emailAddress', {})
-                items.append({
-                    "provider": "outlook",
-                    "account": acc.email,
-                    "id": m.get('id'),
-                    "threadId": m.get('conversationId'),
-                    "open_url": m.get('webLink'),
-                    "snippet": m.get('bodyPreview', ''),
-                    "from": f"{frm.get('name','')} <{frm.get('address','')}>".strip(),
-                    "subject": m.get('subject') or "(no subject)",
-                    "date": m.get('receivedDateTime', '')
-                })
-        except Exception as ex:
-            flash(f"Outlook fetch failed for {acc.email}: {ex}", "danger")
+@email_bp.route('/threads')
+@login_required
+def threads():
+    lookback_days = int(current_app.config.get('EMAIL_LOOKBACK_DAYS', 5))
+    convs, next_cursor = _threads_page()
+    return render_template('email/threads.html', convs=convs, next_cursor=next_cursor, lookback_days=lookback_days)
 
-    # Sort all items by date
-    def parse_date_generic(d):
-        if not d:
-            return datetime.datetime.min
-        try:
-            from email.utils import parsedate_to_datetime
-            return parsedate_to_datetime(d)
-        except Exception:
-            try:
-                return datetime.datetime.fromisoformat(d.replace('Z','+00:00'))
-            except Exception:
-                return datetime.datetime.min
+@email_bp.route('/threads/more')
+@login_required
+def threads_more():
+    convs, next_cursor = _threads_page(request.args.get('cursor'))
+    return render_template('email/thread_rows.html', convs=convs, next_cursor=next_cursor)
+
+@email_bp.route('/search')
+@login_required
+def search():
+    q = request.args.get('q', '').strip()
+    acct = request.args.get('account', '')  # "<provider>:<email>" or "" for all
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = int(current_app.config.get('EMAIL_PAGE_SIZE', 50))
+    provider, _, account = acct.partition(':')
+    hits = search_mail(q, provider=provider or None, account=account or None,
+                       limit=per_page + 1, offset=(page - 1) * per_page) if q else []
+    accounts = ([('gmail', a.email) for a in GmailAccount.query.order_by(GmailAccount.email.asc())] +
+                [('outlook', a.email) for a in OutlookAccount.query.order_by(OutlookAccount.email.asc())])
+    return render_template('email/search.html', q=q, account=acct, accounts=accounts,
+                           hits=hits[:per_page], page=page, has_more=len(hits) > per_page)
 
-    items.sort(key=lambda x: parse_date_generic(x['date']), reverse=True)
-    return render_template('email/list.html', g_accounts=g_accounts, o_accounts=o_accounts, items=items, lookback_days=lookback_days)
+def _sync_with_deadline(only=None):
+    # on the background pool; whatever misses the deadline finishes there
+    deadline = int(current_app.config.get('EMAIL_FETCH_DEADLINE_MS', 8000)) / 1000
+    errors, pending = sync_all(current_app._get_current_object(), deadline=deadline, only=only)
+    for err in errors:
+        flash(err, "danger")
+    if pending:
+        flash(f"Still loading {len(pending)} account(s); they will appear when ready.", "info")
+
+@email_bp.route('/sync', methods=['POST'])
+@login_required
+def sync_now():
+    _sync_with_deadline()
+    return redirect(url_for('email.inbox'))
 
 # --- Gmail account management ---
 @email_bp.route('/accounts')
@@ -244,7 +179,9 @@ def g_oauth2_callback():
     else:
         acc.token_path = str(token_path)
     db.session.commit()
+    invalidate_client('gmail', email)
     flash(f"Connected Gmail account: {email}", "success")
+    _sync_with_deadline(only={('gmail', email)})
     return redirect(url_for('email.accounts'))
 
 @email_bp.route('/gmail/<int:aid>/delete', methods=['POST'])
@@ -255,6 +192,7 @@ def g_delete_account(aid):
         pathlib.Path(acc.token_path).unlink(missing_ok=True)
     except Exception as ex:
         print("gmail token delete:", ex)
+    purge_account('gmail', acc.email)
     db.session.delete(acc)
     db.session.commit()
     flash("Removed Gmail account", "info")
@@ -287,8 +225,7 @@ def o_oauth2_callback():
         return redirect(url_for('email.accounts'))
     # Find email
     try:
-        headers = {"Authorization": f"Bearer {result['access_token']}"}
-        me = requests.get("https://graph.microsoft.com/v1.0/me?$select=mail,userPrincipalName", headers=headers, timeout=20).json()
+        me = graph_client().get_json("/me?$select=mail,userPrincipalName", result['access_token'])
         email = me.get('mail') or me.get('userPrincipalName')
     except Exception as ex:
         flash(f"Outlook: could not resolve account: {ex}", "danger")
@@ -303,7 +240,9 @@ def o_oauth2_callback():
     else:
         acc.token_path = str(_o_token_path_for(email))
     db.session.commit()
+    invalidate_client('outlook', email)
     flash(f"Connected Outlook account: {email}", "success")
+    _sync_with_deadline(only={('outlook', email)})
     return redirect(url_for('email.accounts'))
 
 @email_bp.route('/outlook/<int:aid>/delete', methods=['POST'])
@@ -314,6 +253,7 @@ def o_delete_account(aid):
         pathlib.Path(acc.token_path).unlink(missing_ok=True)
     except Exception as ex:
         print("outlook token delete:", ex)
+    purge_account('outlook', acc.email)
     db.session.delete(acc)
     db.session.commit()
     flash("Removed Outlook account", "info")
@@ -3,6 +3,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from ..extensions import db
 from ..models import Note
+from ..search import ranked
 
 notes_bp = Blueprint('notes', __name__)
 
@@ -10,12 +11,13 @@ notes_bp = Blueprint('notes', __name__)
 @login_required
 def list_notes():
     q = request.args.get('q', '').strip()
-    query = Note.query
+    query = Note.query.order_by(Note.created_at.desc())
+    more = False
     if q:
-        like = f"%{q}%"
-        query = query.filter((Note.title.ilike(like)) | (Note.body.ilike(like)))
-    notes = query.order_by(Note.created_at.desc()).all()
-    return render_template('notes/list.html', notes=notes, q=q)
+        notes, more = ranked(query, Note, 'note', q, (Note.title, Note.body))
+    else:
+        notes = query.all()
+    return render_template('notes/list.html', notes=notes, q=q, more=more)
 
 @notes_bp.route('/new', methods=['GET','POST'])
 @login_required
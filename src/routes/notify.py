@@ -0,0 +1,45 @@
+import queue
+from flask import Blueprint, Response, request, current_app
+from flask_login import login_required
+from ..notify import broker, since
+
+# Server-sent events stream for the toasts in static/js/app.js (see src/notify.py).
+
+notify_bp = Blueprint('notify', __name__)
+
+HEARTBEAT_SECONDS = 20  # keeps proxies from closing idle streams and notices gone clients
+RETRY_MS = 5000
+
+def _frame(n):
+    return f"id: {n.id}\nevent: {n.kind}\ndata: {n.data}\n\n"
+
+@notify_bp.route('/stream')
+@login_required
+def stream():
+    last = request.headers.get('Last-Event-ID', type=int)
+    q = broker.subscribe(current_app._get_current_object())
+    # read the catch-up now: the generator runs after the request's session is gone
+    backlog = since(last) if last is not None else []
+
+    def events():
+        sent = last or 0
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            for n in backlog:
+                sent = n.id
+                yield _frame(n)
+            while True:
+                try:
+                    n = q.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if n.id <= sent:
+                    continue  # already sent with the catch-up
+                sent = n.id
+                yield _frame(n)
+        finally:
+            broker.unsubscribe(q)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
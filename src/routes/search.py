@@ -0,0 +1,42 @@
+from flask import Blueprint, render_template, request, current_app, url_for
+from flask_login import login_required
+from ..models import Task
+from ..search import search, fts_available, KINDS
+
+# Global search over the FTS index in src/search.py.
+
+search_bp = Blueprint('search', __name__)
+
+LABELS = {'note': 'Note', 'contact': 'Contact', 'bookmark': 'Bookmark', 'task': 'Task',
+          'task_note': 'Task note', 'subtask': 'Subtask'}
+
+def _hit_url(hit):
+    kind = hit['kind']
+    if kind == 'note':
+        return url_for('notes.edit_note', nid=hit['id'])
+    if kind == 'contact':
+        return url_for('contacts.edit_contact', cid=hit['id'])
+    if kind == 'bookmark':
+        return url_for('bookmarks.edit_bookmark', bid=hit['id'])
+    return url_for('tasks.view_task', tid=hit['parent'] or hit['id'])
+
+@search_bp.route('/')
+@login_required
+def index():
+    q = request.args.get('q', '').strip()
+    kind = request.args.get('kind', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = int(current_app.config.get('SEARCH_PAGE_SIZE', 30))
+    hits = search(q, kinds=[kind] if kind in KINDS else None,
+                  limit=per_page + 1, offset=(page - 1) * per_page) if q else []
+    has_more = len(hits) > per_page
+    hits = hits[:per_page]
+    # task notes / subtasks are shown under their task's title
+    parent_ids = {h['parent'] for h in hits if h['parent']}
+    parents = dict(Task.query.with_entities(Task.id, Task.title).filter(Task.id.in_(parent_ids))) if parent_ids else {}
+    for h in hits:
+        h['url'] = _hit_url(h)
+        h['label'] = LABELS[h['kind']]
+        h['parent_title'] = parents.get(h['parent'])
+    return render_template('search/results.html', q=q, kind=kind, kinds=LABELS, hits=hits,
+                           page=page, has_more=has_more, available=fts_available())
@@ -1,43 +1,79 @@
 
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
+from sqlalchemy import and_, or_
 from flask_login import login_required
 from ..extensions import db
-from ..models import Task, Tag, TaskNote, TaskLink, Subtask
+from ..models import Task, Tag, TaskNote, TaskLink, Subtask, TASK_LIST_LOAD, TASK_DETAIL_LOAD
+from ..tags import resolve_tags
+from ..task_bulk import target_ids, bulk_apply, BulkError
+from ..facets import task_facets
+from ..suggest import suggest_tags
 
 tasks_bp = Blueprint('tasks', __name__)
 
 def parse_tags(tag_str: str):
     names = [t.strip().lower() for t in (tag_str or '').split(',') if t.strip()]
-    uniq = []
-    for n in names:
-        if n not in uniq:
-            uniq.append(n)
-    tags = []
-    for name in uniq:
-        t = Tag.query.filter_by(name=name).first()
-        if not t:
-            t = Tag(name=name)
-            db.session.add(t)
-        tags.append(t)
-    return tags
+    return resolve_tags(names)
 
-@tasks_bp.route('/')
-@login_required
-def list_tasks():
-    status = request.args.get('status', '')
-    category = request.args.get('category', '')
-    tag = request.args.get('tag', '').strip().lower()
-    query = Task.query
+# Keyset (seek) pagination in list order: due_at asc (undated last), priority desc, id.
+# Dated and undated tasks are paged as two index range scans, so page N costs the same as
+# page 1. The cursor is "<due_at iso or empty>~<priority>~<id>" of the last row shown.
+def _encode_task_cursor(t):
+    return f"{t.due_at.isoformat() if t.due_at else ''}~{t.priority or 0}~{t.id}"
+
+def _decode_task_cursor(cursor):
+    try:
+        due, prio, tid = cursor.split('~')
+        return (datetime.fromisoformat(due) if due else None), int(prio), int(tid)
+    except (ValueError, AttributeError):
+        return None
+
+def _after_prio_id(prio, tid):
+    return or_(Task.priority < prio, and_(Task.priority == prio, Task.id > tid))
+
+def _tasks_page(query, cursor, page_size):
+    after = _decode_task_cursor(cursor) if cursor else None
+    rows = []
+    if after is None or after[0] is not None:
+        dated = query.filter(Task.due_at.isnot(None))
+        if after:
+            due, prio, tid = after
+            dated = dated.filter(or_(Task.due_at > due, and_(Task.due_at == due, _after_prio_id(prio, tid))))
+        rows = dated.order_by(Task.due_at.asc(), Task.priority.desc(), Task.id.asc()).limit(page_size + 1).all()
+    if len(rows) <= page_size:
+        undated = query.filter(Task.due_at.is_(None))
+        if after and after[0] is None:
+            undated = undated.filter(_after_prio_id(after[1], after[2]))
+        rows += undated.order_by(Task.priority.desc(), Task.id.asc()).limit(page_size + 1 - len(rows)).all()
+    next_cursor = _encode_task_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+def _filtered_tasks(status, category, tag):
+    query = Task.query.options(*TASK_LIST_LOAD)
     if status:
         query = query.filter(Task.status == status)
     if category:
         query = query.filter(Task.category == category)
     if tag:
         query = query.join(Task.tags).filter(Tag.name == tag)
-    tasks = query.order_by(Task.due_at.asc().nullslast(), Task.priority.desc()).all()
-    all_tags = Tag.query.order_by(Tag.name.asc()).all()
-    return render_template('tasks/list.html', tasks=tasks, status=status, category=category, tag=tag, all_tags=all_tags)
+    return query
+
+@tasks_bp.route('/')
+@login_required
+def list_tasks():
+    status = request.args.get('status', '')
+    category = request.args.get('category', '')
+    tag = request.args.get('tag', '').strip().lower()
+    cursor = request.args.get('cursor')
+    page_size = int(current_app.config.get('TASKS_PAGE_SIZE', 50))
+    tasks, next_cursor = _tasks_page(_filtered_tasks(status, category, tag), cursor, page_size)
+    if request.headers.get('HX-Request') and cursor:
+        # infinite scroll: just the next rows
+        return render_template('tasks/rows.html', tasks=tasks, next_cursor=next_cursor,
+                               status=status, category=category, tag=tag)
+    return render_template('tasks/list.html', tasks=tasks, next_cursor=next_cursor,
+                           status=status, category=category, tag=tag, facets=task_facets())
 
 @tasks_bp.route('/new', methods=['GET','POST'])
 @login_required
@@ -68,16 +104,29 @@ def new_task():
     preset = datetime.now().replace(second=0, microsecond=0).isoformat()
     return render_template('tasks/edit.html', task=None, preset_start=preset)
 
+@tasks_bp.route('/tags/suggest')
+@login_required
+def suggest_tag_names():
+    """Tag names starting with `q`: a JSON list, or <option>s for htmx."""
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    if request.headers.get('HX-Request'):
+        # datalist of the comma separated tags field (sent as `tags`): complete its last entry
+        head, sep, last = request.args.get('tags', '').rpartition(',')
+        prefix = f"{head}, " if sep else ''
+        return render_template('tasks/tag_options.html',
+                               options=[prefix + n for n in suggest_tags(last.strip(), limit)])
+    return jsonify(suggest_tags(request.args.get('q', ''), limit))
+
 @tasks_bp.route('/<int:tid>')
 @login_required
 def view_task(tid):
-    t = Task.query.get_or_404(tid)
+    t = Task.query.options(*TASK_DETAIL_LOAD).filter_by(id=tid).first_or_404()
     return render_template('tasks/view.html', task=t)
 
 @tasks_bp.route('/<int:tid>/edit', methods=['GET','POST'])
 @login_required
 def edit_task(tid):
-    t = Task.query.get_or_404(tid)
+    t = Task.query.options(*TASK_DETAIL_LOAD).filter_by(id=tid).first_or_404()
     if request.method == 'POST':
         t.title = request.form.get('title', '').strip()
         t.description = request.form.get('description', '').strip()
@@ -112,6 +161,34 @@ def delete_task(tid):
     flash('Task deleted', 'info')
     return redirect(url_for('tasks.list_tasks'))
 
+@tasks_bp.route('/bulk', methods=['POST'])
+@login_required
+def bulk_tasks():
+    # form (list page toolbar) or JSON: {"action", "value", "scope"} plus "ids": [...] for
+    # scope "selected" (the default) or the list filters for scope "filter"
+    data = request.get_json(silent=True) if request.is_json else None
+    if data is None:
+        data = {k: request.form.get(k, '') for k in ('action', 'value', 'scope', 'status', 'category', 'tag')}
+        data['ids'] = request.form.getlist('ids')
+    status, category = data.get('status') or '', data.get('category') or ''
+    tag = (data.get('tag') or '').strip().lower()
+    back = redirect(url_for('tasks.list_tasks', status=status, category=category, tag=tag))
+    try:
+        ids = target_ids(data.get('ids'), status, category, tag, data.get('scope') or 'selected')
+        n = bulk_apply(ids, data.get('action'), data.get('value'))
+    except (BulkError, ValueError, TypeError) as e:
+        db.session.rollback()
+        if request.is_json:
+            return jsonify(error=str(e)), 400
+        flash(str(e), 'danger')
+        return back
+    db.session.commit()
+    if request.is_json:
+        return jsonify(action=data.get('action'), count=n)
+    flash(f"{n} task{'s' if n != 1 else ''} {'deleted' if data.get('action') == 'delete' else 'updated'}",
+          'info' if n else 'warning')
+    return back
+
 # Notes
 @tasks_bp.route('/<int:tid>/notes', methods=['POST'])
 @login_required
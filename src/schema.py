@@ -0,0 +1,35 @@
+from sqlalchemy import inspect, text
+from .extensions import db
+
+# db.create_all() only creates missing tables. This brings existing tables up to date
+# with the models: adds missing columns (nullable, or with their scalar default) and
+# missing indexes. Safe to run on every start.
+
+def _column_ddl(col, dialect):
+    ddl = f'"{col.name}" {col.type.compile(dialect=dialect)}'
+    default = col.default.arg if col.default is not None and col.default.is_scalar else None
+    if default is not None:
+        literal = f"'{default}'" if isinstance(default, str) else str(int(default) if isinstance(default, bool) else default)
+        ddl += f" DEFAULT {literal}"
+        if not col.nullable:
+            ddl += " NOT NULL"
+    return ddl
+
+def ensure_schema(engine=None):
+    engine = engine or db.engine
+    insp = inspect(engine)
+    tables = set(insp.get_table_names())
+    added = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            have = {c['name'] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name not in have:
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN {_column_ddl(col, engine.dialect)}'))
+                    added.append(f"{table.name}.{col.name}")
+    for table in db.metadata.sorted_tables:
+        for idx in table.indexes:
+            idx.create(engine, checkfirst=True)
+    return added
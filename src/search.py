@@ -0,0 +1,151 @@
+from sqlalchemy import text, or_
+from .extensions import db
+from .mail_search import fts_query, highlight
+
+# One SQLite FTS5 index over notes, contacts, bookmarks, tasks, task notes and subtasks.
+# Unlike mail_fts it stores its own copy of the text (several source tables feed it); the
+# rowid encodes the source -- id * 8 + kind code -- so triggers replace a row by rowid
+# without scanning. Triggers keep it current for ORM writes and plain SQL alike (the
+# task bulk actions, tag renames), so nothing in the app has to remember to reindex.
+# Other databases have no FTS5: the module search boxes fall back to ilike there and the
+# global search reports itself unavailable.
+
+MODULE_LIMIT = 500  # per-module search boxes show at most this many (best) matches
+_available = {}     # engine url -> search_fts exists
+
+KINDS = {'note': 1, 'contact': 2, 'bookmark': 3, 'task': 4, 'task_note': 5, 'subtask': 6}
+
+# kind -> (table, parent expression, title, body, extra); `s` is the source row
+_TASK_TAGS = ("(SELECT group_concat(g.name, ' ') FROM task_tags x JOIN tag g ON g.id = x.tag_id"
+              " WHERE x.task_id = s.id)")
+SOURCES = {
+    'note': ('note', 'NULL', 's.title', 's.body', 'NULL'),
+    'contact': ('contact', 'NULL', 's.name', 's.notes', "coalesce(s.email, '') || ' ' || coalesce(s.phone, '')"),
+    'bookmark': ('bookmark', 'NULL', 's.title', 's.notes', 's.url'),
+    'task': ('task', 'NULL', 's.title', 's.description', _TASK_TAGS),
+    'task_note': ('task_note', 's.task_id', 'NULL', 's.body', 'NULL'),
+    'subtask': ('subtask', 's.task_id', 's.title', 'NULL', 'NULL'),
+}
+# columns whose change re-indexes the row
+WATCHED = {'note': 'title, body', 'contact': 'name, notes, email, phone', 'bookmark': 'title, notes, url',
+           'task': 'title, description', 'task_note': 'body', 'subtask': 'title'}
+
+def _insert(kind, where):
+    table, parent, title, body, extra = SOURCES[kind]
+    return (f"INSERT INTO search_fts(rowid, kind, parent, title, body, extra) "
+            f"SELECT s.id * 8 + {KINDS[kind]}, '{kind}', {parent}, {title}, {body}, {extra} "
+            f"FROM {table} s WHERE {where};")
+
+def _delete(kind, id_):
+    return f"DELETE FROM search_fts WHERE rowid = {id_} * 8 + {KINDS[kind]};"
+
+def _reindex_tasks(ids):
+    # ids: SQL for the task ids; used when the tags of those tasks change
+    return (f"DELETE FROM search_fts WHERE rowid IN (SELECT id * 8 + {KINDS['task']} FROM task WHERE id IN ({ids}));"
+            + _insert('task', f"s.id IN ({ids})"))
+
+def _ddl():
+    out = ["""CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+        kind UNINDEXED, parent UNINDEXED, title, body, extra,
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')"""]
+    for kind, (table, *_cols) in SOURCES.items():
+        out += [
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN
+                {_insert(kind, 's.id = new.id')}
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN
+                {_delete(kind, 'old.id')}
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE OF {WATCHED[kind]} ON {table} BEGIN
+                {_delete(kind, 'old.id')}
+                {_insert(kind, 's.id = new.id')}
+            END""",
+        ]
+    out += [
+        f"""CREATE TRIGGER IF NOT EXISTS task_tags_search_ai AFTER INSERT ON task_tags BEGIN
+            {_reindex_tasks('new.task_id')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS task_tags_search_ad AFTER DELETE ON task_tags BEGIN
+            {_reindex_tasks('old.task_id')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS tag_search_au AFTER UPDATE OF name ON tag BEGIN
+            {_reindex_tasks('SELECT task_id FROM task_tags WHERE tag_id = new.id')}
+        END""",
+    ]
+    return out
+
+def fts_available():
+    engine = db.engine
+    key = str(engine.url)
+    if key not in _available:
+        _available[key] = engine.dialect.name == 'sqlite' and db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'search_fts'")).first() is not None
+    return _available[key]
+
+def ensure_search_index(engine=None):
+    engine = engine or db.engine
+    _available.pop(str(engine.url), None)
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.begin() as conn:
+        existed = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'search_fts'")).first()
+        for ddl in _ddl():
+            conn.execute(text(ddl))
+        if not existed:
+            # index what was written before the search table existed
+            for kind in SOURCES:
+                conn.execute(text(_insert(kind, '1')))
+
+def search(q: str, kinds=None, prefix=False, limit=50, offset=0):
+    """Ranked hits (bm25; title > extra > body) as dicts, best first.
+
+    `prefix` makes every term a prefix query (the per-module boxes, which used to match
+    substrings); the global search only does that for terms written as `term*`.
+    """
+    match = fts_query(q, prefix=prefix)
+    if not match or not fts_available():
+        return []
+    sql = """
+        SELECT rowid >> 3 AS id, kind, parent,
+               highlight(search_fts, 2, char(2), char(3)) AS title,
+               snippet(search_fts, 3, char(2), char(3), '…', 16) AS snippet,
+               highlight(search_fts, 4, char(2), char(3)) AS extra
+        FROM search_fts WHERE search_fts MATCH :match
+    """
+    params = {"match": match, "limit": limit, "offset": offset}
+    if kinds:
+        sql += " AND kind IN (" + ", ".join(f"'{k}'" for k in kinds if k in KINDS) + ")"
+    sql += " ORDER BY bm25(search_fts, 0, 0, 10.0, 1.0, 4.0) LIMIT :limit OFFSET :offset"
+    hits = []
+    for r in db.session.execute(text(sql), params).mappings():
+        hit = dict(r)
+        for k in ('title', 'snippet', 'extra'):
+            hit[k] = highlight(hit[k])
+        hits.append(hit)
+    return hits
+
+def matching_ids(q: str, kind: str, limit=MODULE_LIMIT):
+    """Ids of `kind` rows matching `q`, best first -- for the per-module search boxes."""
+    match = fts_query(q, prefix=True)
+    if not match:
+        return []
+    rows = db.session.execute(text(
+        "SELECT rowid >> 3 FROM search_fts WHERE search_fts MATCH :match AND kind = :kind "
+        "ORDER BY bm25(search_fts, 0, 0, 10.0, 1.0, 4.0) LIMIT :limit"),
+        {"match": match, "kind": kind, "limit": limit})
+    return [r[0] for r in rows]
+
+def ranked(query, model, kind: str, q: str, columns):
+    """Rows of `query` matching `q` for the per-module search boxes: (rows, more).
+
+    Ranked through the FTS index, best MODULE_LIMIT first (`more` says some were cut);
+    without FTS, an ilike over `columns` in the query's own order.
+    """
+    if not fts_available():
+        like = f"%{q}%"
+        return query.filter(or_(*(c.ilike(like) for c in columns))).all(), False
+    ids = matching_ids(q, kind)
+    if not ids:
+        return [], False
+    rank = {id_: n for n, id_ in enumerate(ids)}
+    return sorted(query.filter(model.id.in_(ids)), key=lambda row: rank[row.id]), len(ids) >= MODULE_LIMIT
@@ -0,0 +1,189 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from sqlalchemy import event, select, func
+from sqlalchemy.orm import Session
+from .extensions import db
+from .models import Contact, Tag
+
+# Typeahead for contacts and tags: an in-memory sorted list of (normalized key, id) per
+# kind, so a prefix lookup is one bisect plus a short forward walk -- no query per
+# keystroke. Loaded at startup, patched from this process's commits (SQLAlchemy events;
+# tags created by the conflict-tolerant insert in tags.py are reported explicitly) and
+# reloaded when a cheap (count, max(updated_at)) check disagrees with what the index holds,
+# i.e. when another process wrote.
+
+REFRESH_SECONDS = 60
+_DIGITS = re.compile(r'\D')
+_PHONEISH = re.compile(r'[\d\s()+.\-]+')
+
+def normalize(s):
+    """Casefolded, accents stripped, whitespace collapsed."""
+    s = unicodedata.normalize('NFKD', s or '')
+    s = ''.join(c for c in s if not unicodedata.combining(c))
+    return ' '.join(s.casefold().split())
+
+def digits(s):
+    return _DIGITS.sub('', s or '')
+
+class PrefixIndex:
+    def __init__(self, model, keys_of, payload_of):
+        self.model = model
+        self.keys_of = keys_of        # row -> normalized keys
+        self.payload_of = payload_of  # row -> what a suggestion returns
+        self._keys = []               # sorted (key, id)
+        self._by_id = {}              # id -> (keys, payload, updated_at)
+        self._lock = threading.Lock()
+        self._signature = None        # (count, max updated_at) of what the index holds
+        self._checked = 0.0
+
+    def entry(self, row):
+        return self.keys_of(row), self.payload_of(row), row.updated_at
+
+    def load(self):
+        rows = db.session.execute(select(self.model)).scalars()
+        by_id = {r.id: self.entry(r) for r in rows}
+        keys = sorted((k, id_) for id_, (ks, _p, _at) in by_id.items() for k in ks)
+        with self._lock:
+            self._keys, self._by_id = keys, by_id
+            self._signature = (len(by_id), max((at for _k, _p, at in by_id.values()), default=None))
+            self._checked = time.monotonic()
+
+    def _current_signature(self):
+        return tuple(db.session.execute(
+            select(func.count(self.model.id), func.max(self.model.updated_at))).one())
+
+    def refresh_if_stale(self):
+        if time.monotonic() - self._checked < REFRESH_SECONDS:
+            return
+        self._checked = time.monotonic()
+        if self._current_signature() != self._signature:
+            self.load()  # another process wrote
+
+    def put(self, id_, keys, payload, updated_at):
+        with self._lock:
+            old = self._remove(id_)
+            self._by_id[id_] = (keys, payload, updated_at)
+            for k in keys:
+                insort(self._keys, (k, id_))
+            self._resign(old, updated_at)
+
+    def remove(self, id_):
+        with self._lock:
+            self._resign(self._remove(id_), None)
+
+    def _resign(self, old, new_at):
+        # keep the signature in step with our own writes, so only other processes' writes
+        # make refresh_if_stale reload
+        top = self._signature[1] if self._signature else None
+        if old is not None and old[2] == top and (new_at is None or new_at < top):
+            top = max((at for _k, _p, at in self._by_id.values()), default=None)  # the newest row went
+        elif new_at is not None and (top is None or new_at > top):
+            top = new_at
+        self._signature = (len(self._by_id), top)
+
+    def _remove(self, id_):
+        old = self._by_id.pop(id_, None)
+        if old is None:
+            return None
+        for k in old[0]:
+            i = bisect_left(self._keys, (k, id_))
+            if i < len(self._keys) and self._keys[i] == (k, id_):
+                del self._keys[i]
+        return old
+
+    def lookup(self, prefixes, limit=10):
+        """Payloads whose keys start with any of `prefixes`, in key order, each once."""
+        out, seen = [], set()
+        with self._lock:
+            for prefix in prefixes:
+                if not prefix:
+                    continue
+                i = bisect_left(self._keys, (prefix,))
+                while i < len(self._keys) and len(out) < limit:
+                    key, id_ = self._keys[i]
+                    if not key.startswith(prefix):
+                        break
+                    if id_ not in seen:
+                        seen.add(id_)
+                        out.append(self._by_id[id_][1])
+                    i += 1
+        return out
+
+    def __len__(self):
+        return len(self._by_id)
+
+def _contact_keys(c):
+    name = normalize(c.name)
+    keys = {name, *name.split()}  # "smi" finds "John Smith"
+    if c.email:
+        keys.add(c.email.strip().lower())
+    phone = digits(c.phone)
+    if len(phone) >= 3:
+        keys.add(phone)
+        if len(phone) > 10:
+            keys.add(phone[-10:])  # without the country code
+    keys.discard('')
+    return sorted(keys)
+
+def _contact_payload(c):
+    out = {'id': c.id, 'name': c.name}
+    if c.email:
+        out['email'] = c.email
+    if c.phone:
+        out['phone'] = c.phone
+    return out
+
+contacts = PrefixIndex(Contact, _contact_keys, _contact_payload)
+tags = PrefixIndex(Tag, lambda t: [normalize(t.name)], lambda t: t.name)
+
+INDEXES = {Contact: contacts, Tag: tags}
+
+def load_suggest_indexes():
+    for index in INDEXES.values():
+        index.load()
+
+def suggest_contacts(q, limit=10):
+    contacts.refresh_if_stale()
+    prefixes = [normalize(q)]
+    if _PHONEISH.fullmatch(q or '') and len(digits(q)) >= 2:
+        prefixes.append(digits(q))
+    return contacts.lookup(prefixes, limit)
+
+def suggest_tags(q, limit=10):
+    tags.refresh_if_stale()
+    return tags.lookup([normalize(q)], limit)
+
+# --- keeping up with writes ---
+
+def note_tags(session, rows):
+    """Tags written outside the ORM unit of work (tags.py); applied when `session` commits."""
+    changes = session.info.setdefault('suggest_changes', {})
+    for r in rows:
+        changes[(Tag, r.id)] = tags.entry(r)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault('suggest_changes', {})
+    for obj in (*session.new, *session.dirty):
+        index = INDEXES.get(type(obj))
+        if index is not None:
+            changes[(type(obj), obj.id)] = index.entry(obj)
+    for obj in session.deleted:
+        if type(obj) in INDEXES:
+            changes[(type(obj), obj.id)] = None
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    changes = session.info.pop('suggest_changes', None)
+    for (model, id_), entry in (changes or {}).items():
+        if entry is None:
+            INDEXES[model].remove(id_)
+        else:
+            INDEXES[model].put(id_, *entry)
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_changes(session):
+    session.info.pop('suggest_changes', None)
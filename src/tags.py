@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+from sqlalchemy import event, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from .extensions import db
+from .models import Tag
+from .suggest import note_tags
+
+# Tag name -> Tag resolution for task writes: at most one IN query to find names, one
+# conflict-tolerant bulk insert for the new ones, and one IN query (by id) for the rows.
+# A bounded LRU of name -> id skips the lookup for tags seen recently.
+
+TAG_CACHE_SIZE = 2048
+_cache = OrderedDict()  # name -> id
+_lock = threading.Lock()
+
+def _cache_get(names):
+    found = {}
+    with _lock:
+        for n in names:
+            tid = _cache.get(n)
+            if tid is not None:
+                _cache.move_to_end(n)
+                found[n] = tid
+    return found
+
+def _cache_put(mapping):
+    with _lock:
+        for n, tid in mapping.items():
+            _cache[n] = tid
+            _cache.move_to_end(n)
+        while len(_cache) > TAG_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def invalidate_tag_cache(names=None):
+    with _lock:
+        if names is None:
+            _cache.clear()
+        else:
+            for n in names:
+                _cache.pop(n, None)
+
+@event.listens_for(Tag, 'after_update')
+@event.listens_for(Tag, 'after_delete')
+def _tag_changed(mapper, connection, target):
+    hist = db.inspect(target).attrs.name.history
+    invalidate_tag_cache([target.name, *(hist.deleted or ())])
+
+def _insert_missing(names):
+    rows = [{"name": n} for n in names]
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        db.session.execute(sqlite_insert(Tag).on_conflict_do_nothing(index_elements=['name']), rows)
+    elif dialect == 'postgresql':
+        db.session.execute(pg_insert(Tag).on_conflict_do_nothing(index_elements=['name']), rows)
+    else:
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(Tag), [row])
+            except Exception:
+                pass  # someone else created it meanwhile
+
+def _lookup(names):
+    return dict(db.session.query(Tag.name, Tag.id).filter(Tag.name.in_(names)).all())
+
+def resolve_tags(names, _retry=True):
+    """Tags for `names` (already normalized), in order, creating the missing ones."""
+    names = list(dict.fromkeys(names))
+    if not names:
+        return []
+    ids = _cache_get(names)
+    missing = [n for n in names if n not in ids]
+    new = []
+    if missing:
+        ids.update(_lookup(missing))
+        new = [n for n in missing if n not in ids]
+        if new:
+            _insert_missing(new)
+            ids.update(_lookup(new))
+        _cache_put({n: ids[n] for n in missing if n in ids})
+    by_id = {t.id: t for t in Tag.query.filter(Tag.id.in_(list(ids.values())))}
+    if new:
+        # the insert bypassed the unit of work: tell the typeahead index directly
+        note_tags(db.session, [by_id[ids[n]] for n in new if ids.get(n) in by_id])
+    stale = [n for n in names if ids.get(n) not in by_id]
+    if stale and _retry:
+        # cached id from a rolled-back insert or a deleted tag: resolve those afresh
+        invalidate_tag_cache(stale)
+        return resolve_tags(names, _retry=False)
+    return [by_id[ids[n]] for n in names if ids.get(n) in by_id]
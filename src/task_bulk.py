@@ -0,0 +1,102 @@
+from datetime import datetime
+from sqlalchemy import select, update, delete, insert, literal
+from .extensions import db
+from .models import Task, Tag, TaskNote, TaskLink, Subtask, task_tags
+from .tags import resolve_tags
+from .facets import snapshot, apply_snapshot_change
+
+# Set-based task writes: the target ids are selected once, then every change is a handful of
+# UPDATE/DELETE/INSERT ... SELECT statements over id chunks -- no per-task ORM round trips.
+# The caller commits, so a bulk operation is one transaction. Facet counts are adjusted
+# from a before/after snapshot of the touched rows (the ORM flush hook does not see these).
+
+STATUSES = ('todo', 'doing', 'done')
+CATEGORIES = ('work', 'personal', 'other')
+ACTIONS = ('status', 'category', 'priority', 'tags', 'delete')
+SCOPES = ('selected', 'filter')
+_CHUNK = 500
+
+class BulkError(ValueError):
+    pass
+
+def target_ids(ids=None, status='', category='', tag='', scope='selected'):
+    """Task ids a bulk action applies to.
+
+    scope='selected': the given `ids` (only those that exist); an empty selection is an
+    error, never "everything". scope='filter': every task matching the list filters (no
+    filter: every task) -- only on that explicit choice; `ids` are ignored then.
+    """
+    if scope not in SCOPES:
+        raise BulkError(f'Unknown scope: {scope}')
+    sel = select(Task.id)
+    if scope == 'selected':
+        ids = [int(i) for i in ids or []]
+        if not ids:
+            raise BulkError('No tasks selected')
+        found = []
+        for chunk in _chunks(ids):
+            found += db.session.scalars(sel.where(Task.id.in_(chunk))).all()
+        return sorted(found)
+    if status:
+        sel = sel.where(Task.status == status)
+    if category:
+        sel = sel.where(Task.category == category)
+    if tag:
+        sel = sel.where(Task.id.in_(select(task_tags.c.task_id).join(Tag, Tag.id == task_tags.c.tag_id)
+                                    .where(Tag.name == tag)))
+    return db.session.scalars(sel.order_by(Task.id)).all()
+
+def _chunks(ids):
+    for i in range(0, len(ids), _CHUNK):
+        yield ids[i:i + _CHUNK]
+
+def _update(ids, **values):
+    for chunk in _chunks(ids):
+        db.session.execute(update(Task).where(Task.id.in_(chunk)).values(**values)
+                           .execution_options(synchronize_session=False))
+
+def _set_tags(ids, names):
+    tags = resolve_tags(names)
+    for chunk in _chunks(ids):
+        db.session.execute(delete(task_tags).where(task_tags.c.task_id.in_(chunk)))
+        for tag in tags:
+            db.session.execute(insert(task_tags).from_select(
+                ['task_id', 'tag_id'], select(Task.id, literal(tag.id)).where(Task.id.in_(chunk))))
+    # tag membership is not a Task column: bump updated_at so caches keyed on it notice
+    _update(ids, updated_at=datetime.utcnow())
+
+def _delete(ids):
+    for chunk in _chunks(ids):
+        for model in (TaskNote, TaskLink, Subtask):
+            db.session.execute(delete(model).where(model.task_id.in_(chunk))
+                               .execution_options(synchronize_session=False))
+        db.session.execute(delete(task_tags).where(task_tags.c.task_id.in_(chunk)))
+        db.session.execute(delete(Task).where(Task.id.in_(chunk)).execution_options(synchronize_session=False))
+
+def bulk_apply(ids, action, value=None):
+    """Apply one bulk action to task `ids`; returns how many tasks it touched."""
+    if action not in ACTIONS:
+        raise BulkError(f'Unknown action: {action}')
+    if action == 'status' and value not in STATUSES:
+        raise BulkError(f'Invalid status: {value}')
+    if action == 'category' and value not in CATEGORIES:
+        raise BulkError(f'Invalid category: {value}')
+    if action == 'priority':
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise BulkError(f'Invalid priority: {value}')
+    if not ids:
+        return 0
+    before = snapshot(ids)
+    if action == 'delete':
+        _delete(ids)
+    elif action == 'tags':
+        names = value if isinstance(value, (list, tuple)) else (value or '').split(',')
+        _set_tags(ids, list(dict.fromkeys(n.strip().lower() for n in names if n.strip())))
+    else:
+        _update(ids, **{action: value})
+    apply_snapshot_change(before, {} if action == 'delete' else snapshot(ids))
+    # the statements bypassed the identity map; drop anything stale loaded earlier
+    db.session.expire_all()
+    return len(ids)
@@ -0,0 +1,143 @@
+"""Background worker: runs the scheduled jobs so web processes only serve requests.
+
+    python -m src.worker
+
+Any number of workers may run (one per host, a spare for failover...): they share a
+leader lease in the database and only the current holder runs the jobs. The holder
+renews the lease every third of its TTL; if it stops renewing (crash, hang), another
+worker takes over once the lease expires.
+"""
+import os
+import signal
+import socket
+import threading
+from datetime import datetime, timedelta
+from uuid import uuid4
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+from sqlalchemy import update, delete
+from sqlalchemy.exc import IntegrityError
+from .extensions import db
+from .models import WorkerLock
+from .mail_sync import sync_mail_job, refresh_tokens_job
+from .reminders import start_reminders
+from .notify import prune
+
+LOCK_NAME = 'scheduler'
+
+class LeaderLease:
+    def __init__(self, name, owner, ttl):
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+
+    def acquire(self):
+        """Take or renew the lease; True while this process holds it."""
+        now = datetime.utcnow()
+        try:
+            res = db.session.execute(
+                update(WorkerLock)
+                .where(WorkerLock.name == self.name,
+                       (WorkerLock.owner == self.owner) | (WorkerLock.expires_at < now))
+                .values(owner=self.owner, expires_at=now + self.ttl))
+            if res.rowcount == 0:
+                db.session.add(WorkerLock(name=self.name, owner=self.owner, expires_at=now + self.ttl))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()  # the row exists and someone else holds it
+            return False
+        finally:
+            db.session.remove()
+
+    def release(self):
+        db.session.execute(delete(WorkerLock).where(WorkerLock.name == self.name, WorkerLock.owner == self.owner))
+        db.session.commit()
+        db.session.remove()
+
+def prune_notifications_job(app):
+    with app.app_context():
+        try:
+            prune()
+        finally:
+            db.session.remove()
+
+def start_jobs(app):
+    scheduler = BackgroundScheduler(daemon=True, timezone=app.config.get('TIMEZONE', 'America/Chicago'))
+    scheduler.add_job(
+        func=sync_mail_job,
+        args=[app],
+        trigger=IntervalTrigger(minutes=app.config['EMAIL_SYNC_MINUTES']),
+        id='sync_mail',
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1,
+        next_run_time=datetime.now()
+    )
+    scheduler.add_job(
+        func=refresh_tokens_job,
+        args=[app],
+        trigger=IntervalTrigger(minutes=5),
+        id='refresh_mail_tokens',
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1
+    )
+    scheduler.add_job(
+        func=prune_notifications_job,
+        args=[app],
+        trigger=IntervalTrigger(hours=1),
+        id='prune_notifications',
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1
+    )
+    scheduler.start()
+    # reminders run on their own timer thread, waking at the next fire time
+    reminders = start_reminders(app)
+    return scheduler, reminders
+
+def stop_jobs(jobs):
+    scheduler, reminders = jobs
+    scheduler.shutdown(wait=True)
+    reminders.stop()
+
+def run(app, stop=None):
+    stop = stop or threading.Event()
+    ttl = timedelta(seconds=app.config.get('WORKER_LOCK_TTL_SECONDS', 60))
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+    lease = LeaderLease(LOCK_NAME, owner, ttl)
+    jobs = None
+    print(f"[Worker] {owner} started")
+    try:
+        while not stop.is_set():
+            with app.app_context():
+                leader = lease.acquire()
+            if leader and jobs is None:
+                print(f"[Worker] {owner} is the leader; starting jobs")
+                jobs = start_jobs(app)
+            elif not leader and jobs is not None:
+                print(f"[Worker] {owner} lost the lease; stopping jobs")
+                stop_jobs(jobs)
+                jobs = None
+            stop.wait(ttl.total_seconds() / 3)
+    finally:
+        if jobs is not None:
+            stop_jobs(jobs)
+        with app.app_context():
+            lease.release()
+        print(f"[Worker] {owner} stopped")
+
+def main():
+    from app import create_app
+    app = create_app()
+    if not app.config['SCHEDULER_ENABLED']:
+        print("[Worker] SCHEDULER_ENABLED is false; nothing to do")
+        return
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    run(app, stop)
+
+if __name__ == "__main__":
+    main()
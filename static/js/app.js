@@ -15,3 +15,29 @@ window.PMS=(function(){const prefersDark=window.matchMedia&&window.matchMedia('(
     btn.textContent = collapsed ? 'Show' : 'Hide';
   }, false);
 })();
+
+(function () {
+  // Live notifications (reminders, new mail) over server-sent events; the browser
+  // reconnects by itself and resumes from the last event id.
+  const url = document.body && document.body.dataset.notify;
+  if (!url || !window.EventSource) return;
+
+  function esc(s) {
+    const d = document.createElement('div');
+    d.textContent = s == null ? '' : String(s);
+    return d.innerHTML;
+  }
+
+  const source = new EventSource(url);
+  source.addEventListener('reminder', function (e) {
+    const d = JSON.parse(e.data);
+    if (d.text) PMS.toast(esc(d.text), d.level || 'warning');
+  });
+  source.addEventListener('mail', function (e) {
+    const d = JSON.parse(e.data);
+    if (d.text) PMS.toast(esc(d.text), d.level || 'info');
+    // pages listening with hx-trigger="pms:mail from:body" refresh themselves
+    document.body.dispatchEvent(new CustomEvent('pms:mail', { detail: d }));
+  });
+  window.addEventListener('beforeunload', function () { source.close(); });
+})();
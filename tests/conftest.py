@@ -0,0 +1,36 @@
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+import pytest
+from sqlalchemy import event
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # DATABASE_URL sqlite paths are resolved against the project directory
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:///' + os.path.relpath(tmp_path / 'test.db', ROOT))
+    monkeypatch.setenv('SCHEDULER_ENABLED', 'false')
+    from app import create_app
+    app = create_app()
+    app.config.update(TESTING=True, LOGIN_DISABLED=True)
+    with app.app_context():
+        yield app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@contextmanager
+def count_queries(engine):
+    """Collect every statement sent to `engine` inside the block."""
+    statements = []
+    def before(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', before)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before)
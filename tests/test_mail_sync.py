@@ -0,0 +1,141 @@
+import time
+import pytest
+from src.extensions import db
+from src import mail_sync
+from src.mail_sync import MailRecord, SyncError, sync_account, sync_all
+from src.models import GmailAccount, MailMessage, MailSyncState, Notification
+
+class FakeProvider:
+    """In-memory mailbox with a change log; the cursor is the log position."""
+
+    def __init__(self):
+        self.messages = {}
+        self.log = []     # (message_id, removed)
+        self.calls = []   # cursors the sync asked for
+        self.fail = None
+
+    def add(self, mid, subject='hello', thread=None):
+        self.messages[mid] = MailRecord(mid, thread or mid, f'https://mail.example/{mid}', 'bob@example.com',
+                                        subject, 'snippet', 'today', time.time())
+        self.log.append((mid, False))
+
+    def remove(self, mid):
+        del self.messages[mid]
+        self.log.append((mid, True))
+
+    def __call__(self, acc, lookback_days, cursor):
+        self.calls.append(cursor)
+        if self.fail:
+            raise SyncError(self.fail)
+        if cursor is None or int(cursor) > len(self.log):
+            return {'items': list(self.messages.values()), 'removed': [], 'full': True,
+                    'cursor': str(len(self.log))}
+        changed = self.log[int(cursor):]
+        removed = [mid for mid, gone in changed if gone and mid not in self.messages]
+        items = [self.messages[mid] for mid in dict.fromkeys(m for m, gone in changed if not gone)
+                 if mid in self.messages]
+        return {'items': items, 'removed': removed, 'full': False, 'cursor': str(len(self.log))}
+
+@pytest.fixture
+def fake(app, monkeypatch):
+    provider = FakeProvider()
+    monkeypatch.setitem(mail_sync.PROVIDERS, 'gmail', (GmailAccount, provider))
+    return provider
+
+@pytest.fixture
+def account(app):
+    acc = GmailAccount(email='me@example.com', token_path='unused')
+    db.session.add(acc)
+    db.session.commit()
+    return acc
+
+def _stored():
+    return {m.message_id: m.subject for m in MailMessage.query.filter_by(account='me@example.com')}
+
+def _state():
+    return MailSyncState.query.filter_by(provider='gmail', account='me@example.com').one()
+
+def test_full_sync(fake, account):
+    for i in range(3):
+        fake.add(f'm{i}', subject=f'subject {i}')
+    assert sync_account('gmail', account) is None
+    assert fake.calls == [None]
+    assert _stored() == {'m0': 'subject 0', 'm1': 'subject 1', 'm2': 'subject 2'}
+    assert _state().cursor == '3' and _state().last_error is None
+    # a first sync is a backfill: the inbox is told, but there is nothing to toast
+    notes = Notification.query.all()
+    assert len(notes) == 1 and '"text": null' in notes[0].payload
+
+def test_incremental_sync_adds_and_removes(fake, account):
+    fake.add('m0')
+    fake.add('m1')
+    sync_account('gmail', account)
+    fake.add('m2', subject='new one')
+    fake.remove('m0')
+    assert sync_account('gmail', account) is None
+    assert fake.calls == [None, '2']
+    assert _stored() == {'m1': 'hello', 'm2': 'new one'}
+    assert _state().cursor == '4'
+    assert 'New mail from bob@example.com: new one' in Notification.query.order_by(Notification.id.desc()).first().payload
+    # nothing changed: no fetch of old mail, no notification
+    before = Notification.query.count()
+    sync_account('gmail', account)
+    assert fake.calls[-1] == '4'
+    assert Notification.query.count() == before
+
+def test_cursor_survives_failures_and_full_resync(fake, account):
+    fake.add('m0')
+    fake.add('m1')
+    sync_account('gmail', account)
+    fake.fail = 'token expired'
+    assert sync_account('gmail', account) == 'token expired'
+    assert _state().cursor == '2' and _state().last_error == 'token expired'
+    fake.fail = None
+    fake.remove('m1')
+    sync_account('gmail', account)
+    assert fake.calls[-1] == '2'  # resumed from the stored cursor
+    assert _state().last_error is None and _stored() == {'m0': 'hello'}
+    # an explicit full sync relists the window and drops what is gone
+    fake.messages.clear()
+    fake.add('m5')
+    sync_account('gmail', account, full=True)
+    assert fake.calls[-1] is None
+    assert _stored() == {'m5': 'hello'}
+
+def test_sync_all_uses_the_pool(app, fake, account):
+    fake.add('m0')
+    errors, pending = sync_all(app)
+    assert errors == [] and pending == []
+    db.session.expire_all()
+    assert _stored() == {'m0': 'hello'}
+
+def test_client_cache_follows_the_token_file(app, tmp_path):
+    import os
+    token = tmp_path / 'token.json'
+    token.write_text('v1')
+    loads = []
+    def loader():
+        loads.append(token.read_text())
+        return object()
+    key = ('gmail', 'me@example.com')
+    first = mail_sync._cached_client(key, token, loader)
+    assert mail_sync._cached_client(key, token, loader) is first and loads == ['v1']
+    # our own write-back keeps the client
+    assert mail_sync._save_token(key, token, 'v2')
+    assert mail_sync._cached_client(key, token, loader) is first and loads == ['v1']
+    # another process (a reconnect) rewrites the file: the old credentials are not written back
+    token.write_text('v3')
+    os.utime(token, ns=(0, token.stat().st_mtime_ns + 10**9))
+    assert not mail_sync._save_token(key, token, 'stale')
+    assert token.read_text() == 'v3'
+    assert mail_sync._cached_client(key, token, loader) is not first and loads == ['v1', 'v3']
+
+def test_sync_all_only_the_given_accounts(app, fake, account):
+    other = GmailAccount(email='other@example.com', token_path='unused')
+    db.session.add(other)
+    db.session.commit()
+    fake.add('m0')
+    errors, pending = sync_all(app, deadline=5, only={('gmail', 'me@example.com')})
+    assert errors == [] and pending == []
+    assert len(fake.calls) == 1
+    assert MailSyncState.query.filter_by(account='other@example.com').count() == 0
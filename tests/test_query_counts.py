@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+import pytest
+from src.extensions import db
+from src.models import Task, Tag, TaskNote, TaskLink, Subtask, Event, Note
+from src.reminders import ReminderEngine
+from conftest import count_queries
+
+# Every task view loads a fixed set of relationships (TASK_*_LOAD in models.py, with
+# raiseload('*') for the rest), so the statement count must not grow with the data.
+
+def _seed(n):
+    now = datetime.now()
+    tags = [Tag(name=f'tag{i}') for i in range(3)]
+    for i in range(n):
+        t = Task(title=f'task {i}', status='todo', due_at=now + timedelta(minutes=2 + i), tags=tags[:2])
+        t.notes.append(TaskNote(body=f'note {i}'))
+        t.links.append(TaskLink(title='link', url='https://example.com'))
+        t.subtasks.append(Subtask(title=f'sub {i}'))
+        db.session.add(t)
+        db.session.add(Note(title=f'note {i}', body='body'))
+        db.session.add(Event(title=f'event {i}', start_at=now + timedelta(minutes=3 + i),
+                             end_at=now + timedelta(minutes=33 + i)))
+    db.session.add(Event(title='standup', start_at=now + timedelta(minutes=1),
+                         end_at=now + timedelta(minutes=16), rrule='FREQ=DAILY;COUNT=30'))
+    db.session.commit()
+    db.session.expunge_all()
+    return Task.query.order_by(Task.id).first().id
+
+def _count(client, url):
+    with count_queries(db.engine) as statements:
+        resp = client.get(url)
+    assert resp.status_code == 200, resp.data[:500]
+    return len(statements)
+
+@pytest.mark.parametrize('n', [12, 40])
+def test_task_list_queries(app, client, n):
+    app.config['TASKS_PAGE_SIZE'] = 10
+    _seed(n)
+    # a full page of dated tasks + their tags (selectinload) + facet counts
+    assert _count(client, '/tasks/') == 3
+    # a page that runs out of dated tasks also reads the undated ones
+    assert _count(client, '/tasks/?status=done') == 3
+
+@pytest.mark.parametrize('n', [3, 40])
+def test_task_detail_queries(app, client, n):
+    tid = _seed(n)
+    # the task + tags, notes, links, subtasks
+    assert _count(client, f'/tasks/{tid}') == 5
+    assert _count(client, f'/tasks/{tid}/edit') == 5
+
+@pytest.mark.parametrize('n', [3, 40])
+def test_dashboard_queries(app, client, n):
+    _seed(n)
+    # open tasks (TASK_SCAN_LOAD: no relationships), notes, plain events, series, overrides
+    assert _count(client, '/') == 5
+
+@pytest.mark.parametrize('n', [3, 40])
+def test_calendar_export_queries(app, client, n):
+    _seed(n)
+    with count_queries(db.engine) as statements:
+        resp = client.get('/calendar/export.ics')
+        body = resp.get_data(as_text=True)
+    assert body.count('BEGIN:VEVENT') == n + 1
+    # events + overrides, streamed; the export never writes
+    assert len(statements) == 2
+    assert all(s.lstrip().upper().startswith('SELECT') for s in statements)
+
+@pytest.mark.parametrize('n', [3, 40])
+def test_reminder_reload_queries(app, n):
+    _seed(n)
+    engine = ReminderEngine()
+    with count_queries(db.engine) as statements:
+        engine.reload(datetime.now())
+    assert len(engine._heap) == 2 * n + 1  # tasks, plain events, first standup
+    # tasks, plain events, series, their overrides, delivered_reminder cleanup
+    assert len(statements) == 5
@@ -0,0 +1,21 @@
+from datetime import datetime, timedelta
+from src.extensions import db
+from src.models import Event
+from src import recurrence
+from src.recurrence import expand_series
+
+def test_windows_within_a_day_share_a_cache_entry(app):
+    start = datetime(2026, 1, 5, 9, 0)
+    series = [Event(title=f'standup {i}', start_at=start, end_at=start + timedelta(minutes=15),
+                    rrule='FREQ=DAILY') for i in range(10)]
+    db.session.add_all(series)
+    db.session.commit()
+    recurrence.invalidate_occurrences()
+    now = datetime(2026, 3, 2, 8, 0)
+    for minutes in range(0, 300, 7):  # dashboards and reminder passes through the morning
+        t = now + timedelta(minutes=minutes)
+        occ = expand_series(series, t, t + timedelta(hours=6))
+        # still cut to the exact window
+        assert all(t <= o.end_at and o.start_at < t + timedelta(hours=6) for o in occ)
+        assert len(occ) == (10 if t <= datetime(2026, 3, 2, 9, 15) else 0)
+    assert len(recurrence._cache) == 10
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from src.extensions import db
+from src.models import Task
+from src.reminders import ReminderEngine
+from conftest import count_queries
+
+def test_poll_pends_each_change_once(app):
+    now = datetime.now()
+    db.session.add_all(Task(title=f'task {i}', due_at=now + timedelta(hours=1)) for i in range(20))
+    db.session.commit()
+    engine = ReminderEngine()
+    engine.reload(now)
+    engine._watermark -= timedelta(minutes=1)  # the rows above land inside the lookback
+    engine._poll_changes()
+    assert len(engine._pending) == 20
+    engine._pending.clear()
+    for _ in range(3):
+        engine._poll_changes()
+        assert engine._pending == set()  # nothing written since: nothing to re-read
+    # a bulk statement elsewhere bumps updated_at: picked up once more
+    db.session.execute(update(Task).where(Task.id <= 5).values(updated_at=datetime.utcnow() + timedelta(seconds=1)))
+    db.session.commit()
+    engine._poll_changes()
+    assert {i for _k, i in engine._pending} == {1, 2, 3, 4, 5}
+
+def test_refresh_chunks_large_id_lists(app, monkeypatch):
+    import src.reminders as reminders
+    monkeypatch.setattr(reminders, '_CHUNK', 10)
+    now = datetime.now()
+    db.session.add_all(Task(title=f'task {i}', due_at=now + timedelta(hours=1)) for i in range(25))
+    db.session.commit()
+    engine = ReminderEngine()
+    engine.reload(now)
+    with count_queries(db.engine) as statements:
+        engine._refresh({('task', i) for i in range(1, 26)}, now)
+    assert len(statements) == 3
+    assert len(engine._heap) == 50  # the superseded entries stay until popped
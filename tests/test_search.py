@@ -0,0 +1,37 @@
+from sqlalchemy import text
+from src.extensions import db
+from src.models import Note, Contact, Bookmark
+from src import search
+
+def _seed():
+    db.session.add_all([Note(title='Quarterly planning', body='budget review'),
+                        Note(title='Groceries', body='milk, eggs'),
+                        Contact(name='Ada Lovelace', email='ada@example.com', phone='555-0100'),
+                        Bookmark(title='Python docs', url='https://docs.python.org/3/', notes='reference')])
+    db.session.commit()
+
+def test_module_boxes_use_the_index(app, client):
+    _seed()
+    assert search.fts_available()
+    assert b'Quarterly planning' in client.get('/notes/?q=plan').data
+    assert b'Groceries' not in client.get('/notes/?q=plan').data
+    assert b'Ada Lovelace' in client.get('/contacts/?q=love').data
+    assert b'Python docs' in client.get('/bookmarks/manage?q=pyth').data
+
+def test_module_boxes_fall_back_without_fts(app, client):
+    _seed()
+    db.session.execute(text('DROP TABLE search_fts'))
+    db.session.commit()
+    search._available.clear()
+    assert not search.fts_available()
+    # substring match, like before the index existed
+    assert b'Quarterly planning' in client.get('/notes/?q=lann').data
+    assert b'Ada Lovelace' in client.get('/contacts/?q=0100').data
+    assert b'Python docs' in client.get('/bookmarks/manage?q=python.org').data
+    resp = client.get('/search/?q=plan')
+    assert resp.status_code == 200 and b'needs SQLite' in resp.data
+
+def test_search_page_param(app, client):
+    _seed()
+    assert client.get('/search/?q=plan&page=x').status_code == 200
+    assert b'Quarterly' in client.get('/search/?q=plan*').data
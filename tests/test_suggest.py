@@ -0,0 +1,34 @@
+from sqlalchemy import text
+from src.extensions import db
+from src.models import Contact
+from src import suggest
+from conftest import count_queries
+
+def _check_now(monkeypatch):
+    monkeypatch.setattr(suggest.contacts, '_checked', 0.0)
+
+def test_own_writes_do_not_force_a_reload(app, monkeypatch):
+    db.session.add_all(Contact(name=f'Person {i}') for i in range(5))
+    db.session.commit()
+    suggest.contacts.load()
+    ada = Contact(name='Ada Lovelace', email='ada@example.com')
+    db.session.add(ada)
+    db.session.commit()
+    ada.name = 'Ada King'
+    db.session.commit()
+    db.session.delete(Contact.query.filter_by(name='Person 0').one())
+    db.session.commit()
+    _check_now(monkeypatch)
+    with count_queries(db.engine) as statements:
+        assert [c['name'] for c in suggest.suggest_contacts('kin')] == ['Ada King']
+    assert len(statements) == 1  # the signature check, no reload
+    assert len(suggest.contacts) == 5
+
+def test_other_process_writes_reload(app, monkeypatch):
+    suggest.contacts.load()
+    db.session.execute(text("INSERT INTO contact (name, created_at, updated_at) "
+                            "VALUES ('Grace Hopper', '2030-01-01 00:00:00', '2030-01-01 00:00:00')"))
+    db.session.commit()
+    assert suggest.suggest_contacts('grace') == []  # checked at most every REFRESH_SECONDS
+    _check_now(monkeypatch)
+    assert [c['name'] for c in suggest.suggest_contacts('grace')] == ['Grace Hopper']
@@ -0,0 +1,28 @@
+from src.extensions import db
+from src.models import Task
+
+def _tasks(n=5, status='todo'):
+    db.session.add_all(Task(title=f'task {i}', status=status) for i in range(n))
+    db.session.add(Task(title='finished', status='done'))
+    db.session.commit()
+
+def test_empty_selection_changes_nothing(client):
+    _tasks()
+    r = client.post('/tasks/bulk', data={'scope': 'selected', 'status': 'todo', 'action': 'delete'})
+    assert r.status_code == 302
+    assert Task.query.count() == 6
+    r = client.post('/tasks/bulk', json={'status': 'todo', 'action': 'delete'})
+    assert r.status_code == 400 and Task.query.count() == 6
+    r = client.post('/tasks/bulk', json={'ids': [], 'action': 'delete'})
+    assert r.status_code == 400 and Task.query.count() == 6
+
+def test_selected_and_filter_scopes(client):
+    _tasks()
+    ids = [t.id for t in Task.query.filter_by(status='todo').limit(2)]
+    r = client.post('/tasks/bulk', data={'scope': 'selected', 'ids': ids, 'status': 'todo',
+                                         'action': 'status', 'value': 'doing'})
+    assert r.status_code == 302
+    assert sorted(t.id for t in Task.query.filter_by(status='doing')) == sorted(ids)
+    r = client.post('/tasks/bulk', json={'scope': 'filter', 'status': 'todo', 'action': 'delete'})
+    assert r.get_json() == {'action': 'delete', 'count': 3}
+    assert Task.query.count() == 3
@@ -0,0 +1,138 @@
+"""Gmail metadata fetch: one messages.get per id vs. batched (src.mail_sync.g_get_metadata).
+
+Runs against a local fake Gmail endpoint (bundled discovery doc, rootUrl rewritten),
+so no Google account is needed. Each HTTP round trip gets --latency-ms added to
+mimic a real network. Usage:
+
+    python tools/bench_gmail_batch.py [--messages 50] [--batch-size 50] [--latency-ms 40] [--fail-every 0]
+"""
+import argparse, json, os, re, sys, threading, time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+from src.mail_sync import g_get_metadata, G_METADATA_HEADERS
+
+STATS = {"round_trips": 0, "parts": 0}
+LOCK = threading.Lock()
+
+def fake_message(mid):
+    return {
+        "id": mid, "threadId": "t" + mid, "snippet": "snippet for " + mid,
+        "internalDate": str(1700000000000 + int(mid[1:]) * 1000),
+        "payload": {"headers": [
+            {"name": "From", "value": "Sender <sender@example.com>"},
+            {"name": "Subject", "value": "Subject " + mid},
+            {"name": "Date", "value": "Tue, 14 Nov 2023 22:13:20 +0000"},
+        ]},
+    }
+
+class FakeGmail(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    n_messages = 50
+    latency = 0.04
+    fail_every = 0
+    _failed = set()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, ctype="application/json"):
+        data = body if isinstance(body, bytes) else body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _get_one(self, path):
+        m = re.match(r"/gmail/v1/users/me/messages/([^/?]+)", path)
+        mid = m.group(1)
+        n = int(mid[1:])
+        with LOCK:
+            STATS["parts"] += 1
+            # fail each affected message once with a 429 to exercise part retries
+            if self.fail_every and n % self.fail_every == 0 and mid not in self._failed:
+                self._failed.add(mid)
+                return 429, json.dumps({"error": {"code": 429, "message": "rateLimitExceeded"}})
+        return 200, json.dumps(fake_message(mid))
+
+    def do_GET(self):
+        with LOCK:
+            STATS["round_trips"] += 1
+        time.sleep(self.latency)
+        if self.path.startswith("/gmail/v1/users/me/messages/"):
+            status, body = self._get_one(self.path)
+            return self._send(status, body)
+        if self.path.startswith("/gmail/v1/users/me/messages"):
+            ids = [{"id": f"m{i}", "threadId": f"tm{i}"} for i in range(self.n_messages)]
+            return self._send(200, json.dumps({"messages": ids}))
+        self._send(404, "{}")
+
+    def do_POST(self):
+        with LOCK:
+            STATS["round_trips"] += 1
+        time.sleep(self.latency)
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        msg = BytesParser(policy=HTTP).parsebytes(
+            b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body)
+        boundary = "batch_response_boundary"
+        out = []
+        for part in msg.iter_parts():
+            cid = part["Content-ID"].strip("<>")
+            request_line = part.get_payload().splitlines()[0]
+            status, payload = self._get_one(request_line.split(" ")[1])
+            reason = "OK" if status == 200 else "Too Many Requests"
+            out.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{cid}>\r\n\r\n"
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n\r\n{payload}\r\n")
+        out.append(f"--{boundary}--\r\n")
+        self._send(200, "".join(out), f"multipart/mixed; boundary={boundary}")
+
+def make_service(port):
+    doc = json.loads(get_static_doc("gmail", "v1"))
+    doc["rootUrl"] = f"http://127.0.0.1:{port}/"
+    return build_from_document(doc, http=httplib2.Http())
+
+def run(label, service, fn):
+    STATS.update(round_trips=0, parts=0)
+    t0 = time.perf_counter()
+    ids = [m["id"] for m in service.users().messages().list(userId="me", maxResults=50).execute()["messages"]]
+    got = fn(service, ids)
+    wall = time.perf_counter() - t0
+    print(f"{label:<22} messages={len(got):<4} round_trips={STATS['round_trips']:<4} wall={wall * 1000:8.1f} ms")
+
+def sequential(service, ids):
+    # what inbox() used to do: one messages.get per id
+    return [service.users().messages().get(userId="me", id=mid, format="metadata",
+                metadataHeaders=G_METADATA_HEADERS).execute() for mid in ids]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=50)
+    ap.add_argument("--batch-size", type=int, default=50)
+    ap.add_argument("--latency-ms", type=float, default=40)
+    ap.add_argument("--fail-every", type=int, default=0, help="429 every Nth message once (tests part retry)")
+    args = ap.parse_args()
+
+    FakeGmail.n_messages = args.messages
+    FakeGmail.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGmail)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    service = make_service(server.server_address[1])
+    try:
+        run("sequential get", service, sequential)
+        FakeGmail.fail_every = args.fail_every
+        run(f"batch (size={args.batch_size})", service,
+            lambda svc, ids: g_get_metadata(svc, ids, batch_size=args.batch_size))
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
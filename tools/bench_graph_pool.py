@@ -0,0 +1,95 @@
+"""Graph calls: bare requests.get per call vs. the pooled keep-alive GraphClient.
+
+Runs against a local HTTPS stand-in (self-signed cert generated with the openssl CLI)
+that counts TLS connections and serves gzip when asked. Usage:
+
+    python tools/bench_graph_pool.py [--calls 100] [--page-size 50]
+"""
+import argparse, gzip, json, os, ssl, subprocess, sys, tempfile, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from src.graph_client import GraphClient
+
+STATS = {"connections": 0, "requests": 0, "bytes": 0}
+LOCK = threading.Lock()
+
+class FakeGraph(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    page_size = 50
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        with LOCK:
+            STATS["connections"] += 1
+        super().setup()
+
+    def do_GET(self):
+        value = [{"id": f"m{i}", "subject": f"Subject {i}", "bodyPreview": "lorem ipsum " * 10,
+                  "receivedDateTime": "2024-01-01T00:00:00Z", "conversationId": "c1",
+                  "from": {"emailAddress": {"name": "Sender", "address": "sender@example.com"}}}
+                 for i in range(self.page_size)]
+        body = json.dumps({"value": value}).encode()
+        gz = "gzip" in (self.headers.get("Accept-Encoding") or "")
+        if gz:
+            body = gzip.compress(body)
+        with LOCK:
+            STATS["requests"] += 1
+            STATS["bytes"] += len(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if gz:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def make_cert(tmp):
+    cert, key = os.path.join(tmp, "cert.pem"), os.path.join(tmp, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+                    "-keyout", key, "-out", cert], check=True, capture_output=True)
+    return cert, key
+
+def run(label, fn, calls):
+    STATS.update(connections=0, requests=0, bytes=0)
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    wall = time.perf_counter() - t0
+    print(f"{label:<18} calls={calls:<5} tls_connections={STATS['connections']:<5} "
+          f"wire_bytes={STATS['bytes']:<9} wall={wall * 1000:8.1f} ms")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=100)
+    ap.add_argument("--page-size", type=int, default=50)
+    args = ap.parse_args()
+    FakeGraph.page_size = args.page_size
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cert, key = make_cert(tmp)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGraph)
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ctx.load_cert_chain(cert, key)
+        server.socket = ctx.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"https://127.0.0.1:{server.server_address[1]}/v1.0/me/messages"
+        try:
+            # what the Outlook path used to do: a bare requests.get per call
+            run("requests.get", lambda: requests.get(url, headers={"Authorization": "Bearer x"},
+                timeout=20, verify=cert).json(), args.calls)
+            client = GraphClient()
+            client.session.verify = cert
+            client.session.trust_env = False  # keep REQUESTS_CA_BUNDLE from overriding verify
+            run("GraphClient", lambda: client.get_json(url, "x"), args.calls)
+        finally:
+            server.shutdown()
+
+if __name__ == "__main__":
+    main()